@@ -0,0 +1,195 @@
+"""
+Offline analysis of many positions: reads one position per line, searches
+them in a process pool and streams one JSON line per position as each
+search finishes.
+
+    python analysis.py positions.txt --time 500 --workers 8 --out analysis.jsonl
+
+A line holds either a FEN written by bitboard.to_fen, optionally followed by
+'moves <move> ...', or the moves of a game from the start position in the
+notation of game.index_to_notation ("d2-d3 e8-e7 ..."; move numbers such as
+"1." are skipped). The arguments of engine.py's position command, 'fen
+<rows> <b|w> [moves ...]' and 'startpos [moves ...]', are read as well.
+Blank lines and lines starting with '#' are ignored.
+
+The input is read lazily and only a few positions per worker are in flight
+at a time, so memory stays flat however large the file is. Results come out
+in the order they finish; their 'line' field gives the input line.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import sys
+import threading
+import time
+
+from bitboard import from_board, from_fen, generate_moves, make_move, move_from_notation, move_to_notation, to_fen
+from brain import MAX_DEPTH, analyse, get_default_tablebase
+from transposition import TranspositionTable
+from utils import START_POSITION
+
+TT_MB = 16  # Per worker
+TASKS_PER_WORKER = 4  # Positions queued per worker; bounds how much of the input is held in memory
+
+_worker = {}  # Per-process state set up by _init_worker
+
+
+def parse_line(line):
+    """
+    Reads one input line.
+    :return: (position, player)
+    :raises ValueError: If the line isn't a position, or one of its moves is illegal
+    """
+    tokens = line.split()
+    if "moves" in tokens:
+        moves = tokens[tokens.index("moves") + 1:]
+        tokens = tokens[:tokens.index("moves")]
+    else:
+        moves = []
+    fen = tokens[:1] == ["fen"]
+    if fen:
+        tokens = tokens[1:]  # engine.py's 'position fen ...' syntax
+        if len(tokens) != 2:
+            raise ValueError(f"expected 'fen <rows> <b|w> [moves ...]': {line.strip()!r}")
+    if tokens == ["startpos"]:
+        position, player = from_board(START_POSITION), 2
+    elif fen or (len(tokens) == 2 and "/" in tokens[0]):
+        position, player = from_fen(" ".join(tokens))
+    elif not moves:
+        position, player, moves = from_board(START_POSITION), 2, tokens  # White moves first
+    else:
+        raise ValueError(f"expected '[fen] <fen> [moves ...]', 'startpos [moves ...]' or a list of moves: "
+                         f"{line.strip()!r}")
+    for text in moves:
+        if text.endswith(".") and text[:-1].isdigit():
+            continue  # Move number
+        move = move_from_notation(text)
+        if move not in generate_moves(position, player):
+            raise ValueError(f"illegal move {text}")
+        position, player = make_move(position, move), 3 - player
+    return position, player
+
+
+def _init_worker(depth, time_limit_ms, tt_mb):
+    _worker['depth'] = depth
+    _worker['time_limit_ms'] = time_limit_ms
+    _worker['tt'] = TranspositionTable(tt_mb)
+    _worker['tablebase'] = get_default_tablebase()
+
+
+def analyse_task(args):
+    """
+    Analyses one input line. Runs in a worker process.
+    :param args: (line_number, line)
+    :return: A result record, as written to the JSONL output
+    """
+    line_number, line = args
+    try:
+        position, player = parse_line(line)
+    except ValueError as error:
+        return {'line': line_number, 'error': str(error)}
+    depth, time_limit_ms = _worker['depth'], _worker['time_limit_ms']
+    stop = threading.Event()
+
+    def reached(stats):
+        if time_limit_ms is not None and stats.depth >= depth:
+            stop.set()  # Both a depth and a time were given, whichever comes first ends the search
+
+    tt = _worker['tt']
+    tt.clear()  # Every position starts from an empty table, so results don't depend on the worker
+    stats = analyse(position, player, depth, time_limit_ms, tt, stop, reached, tablebase=_worker['tablebase'])
+    return {
+        'line': line_number,
+        'fen': to_fen(position, player),
+        'move': move_to_notation(stats.best_move) if stats.best_move else None,
+        'score': stats.score,
+        'pv': [move_to_notation(move) for move in stats.pv],
+        'depth': stats.depth,
+        'nodes': stats.nodes,
+        'elapsed_ms': round(stats.elapsed * 1000, 3),
+    }
+
+
+def read_positions(lines):
+    """Yields (line_number, line) for every line that holds a position, numbered from 1."""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line_number, line
+
+
+def analyse_lines(lines, depth=None, time_limit_ms=None, workers=None, tt_mb=TT_MB):
+    """
+    Analyses every position in lines, which is read lazily.
+    :param lines: Iterable of input lines, such as an open file
+    :param depth: Search depth; with time_limit_ms too, whichever comes first ends the search
+    :param time_limit_ms: Time budget per position
+    :param workers: Worker processes, one per core by default
+    :param tt_mb: Transposition table size per worker
+    :return: A generator of result records, in the order the searches finish
+    """
+    if depth is None:
+        if time_limit_ms is None:
+            raise ValueError("Give a depth, a time limit or both")
+        depth = MAX_DEPTH
+    workers = workers or mp.cpu_count()
+    limit = workers * TASKS_PER_WORKER
+    # Pool.imap would read the whole input ahead of the workers, so tasks are
+    # submitted one by one and never more than limit are waiting
+    finished = queue.Queue()
+    pending = 0
+    with mp.Pool(workers, _init_worker, (depth, time_limit_ms, tt_mb)) as pool:
+        for task in read_positions(lines):
+            while pending >= limit:
+                yield _result(finished.get())
+                pending -= 1
+            pool.apply_async(analyse_task, (task,), callback=finished.put, error_callback=finished.put)
+            pending += 1
+            while not finished.empty():
+                yield _result(finished.get())
+                pending -= 1
+        while pending:
+            yield _result(finished.get())
+            pending -= 1
+
+
+def _result(record):
+    if isinstance(record, BaseException):
+        raise record  # A worker crashed, rather than rejecting its line
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a file of positions, one JSON line per position.")
+    parser.add_argument("input", help="File with one position per line, '-' for stdin")
+    parser.add_argument("--depth", type=int, default=None, help="Search depth; combined with --time, whichever ends first")
+    parser.add_argument("--time", type=int, default=None, help="Milliseconds per position")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, one per core by default")
+    parser.add_argument("--hash", type=int, default=TT_MB, help="Transposition table megabytes per worker")
+    parser.add_argument("--out", default=None, help="JSONL file that receives the results, stdout by default")
+    args = parser.parse_args()
+    if args.depth is None and args.time is None:
+        parser.error("give --depth, --time or both")
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = open(args.out, "w") if args.out else sys.stdout
+    analysed = errors = 0
+    start = time.perf_counter()
+    try:
+        for record in analyse_lines(source, args.depth, args.time, args.workers, args.hash):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            analysed += 1
+            errors += 'error' in record
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{analysed} positions ({errors} rejected) in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
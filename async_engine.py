@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from bitboard import from_board, move_to_coords
+from brain import iterative_deepening, resolve_book, resolve_tablebase
+from transposition import TranspositionTable
+
+
+class SearchHandle:
+    """
+    Handle for a move search running in the background. Poll done() from the
+    game loop, read best_move_so_far() while it runs, and cancel() it when the
+    position it was started from is no longer current.
+    """
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.future = None
+        self.depth = 0  # Depth of the last completed iteration
+        self.score = None
+        self._best_move = None
+
+    def _on_iteration(self, depth, score, move, pv, nodes):
+        # Runs on the search thread; single attribute writes are safe to read from the game loop
+        self.depth, self.score, self._best_move = depth, score, move
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Waits for the search to finish.
+        :return: The best move as ((start_row, start_col), (end_row, end_col)), or None; after
+                 cancel(), the best move of the last completed iteration, which is None when the
+                 search was cancelled before it started
+        """
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            return self.best_move_so_far()  # Cancelled while still queued behind another search
+
+    def cancel(self):
+        """
+        Stops the search; result() then gives the best move of the last completed iteration.
+        A search still waiting for the engine thread never starts.
+        """
+        self.stop.set()
+        self.future.cancel()
+
+    def cancelled(self):
+        return self.stop.is_set()
+
+    def best_move_so_far(self):
+        """Returns the best move of the last completed iteration, or None before depth 1 is done."""
+        move = self._best_move
+        return move_to_coords(move) if move else None
+
+
+class AsyncEngine:
+    """
+    Runs ai_move-style searches on a background thread so the caller (the
+    pygame loop) keeps drawing and handling input. Searches run one at a time
+    and share a transposition table that lasts for the whole game.
+    """
+
+    def __init__(self, tt=None, tablebase=None, book=None, use_book=True, use_tablebase=True):
+        """
+        :param tt: TranspositionTable kept for the game, a new one by default
+        :param tablebase: Tablebase to probe, the default tables when not given
+        :param book: OpeningBook to play from, the default book when not given
+        :param use_book: False to search every move; book=False does the same
+        :param use_tablebase: False to search without tablebases; tablebase=False does the same
+        """
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.tablebase = resolve_tablebase(tablebase, use_tablebase)
+        self.book = resolve_book(book, use_book)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fianco-search')
+        self.current = None  # Handle of the most recent request
+
+    def request_move(self, board, current_player, depth=3, time_limit_ms=None):
+        """
+        Starts searching for a move and returns immediately.
+        :param board: The current game board as a list of lists; it is copied, so the caller may keep changing it
+        :param current_player: The player to move (1 for black, 2 for white)
+        :param depth: The search depth in plies, ignored when time_limit_ms is given
+        :param time_limit_ms: Optional time budget; the search deepens until it runs out
+        :return: A SearchHandle
+        """
+        position = from_board(board)
+        handle = SearchHandle()
+
+        def run():
+            if self.book is not None:
+                book_move = self.book.choose(position, current_player)
+                if book_move is not None:
+                    return move_to_coords(book_move)  # Played without searching
+            best_move = iterative_deepening(position, current_player, depth, time_limit_ms, self.tt,
+                                            handle.stop, handle._on_iteration, tablebase=self.tablebase)[0]
+            return move_to_coords(best_move) if best_move else None
+
+        handle.future = self.executor.submit(run)
+        self.current = handle
+        return handle
+
+    def new_game(self):
+        """Cancels any running search and forgets everything learned in the previous game."""
+        if self.current is not None:
+            self.current.cancel()
+        self.tt.clear()
+
+    def shutdown(self):
+        if self.current is not None:
+            self.current.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,102 @@
+"""
+Speed benchmark for move generation and search over the perft reference
+positions.
+
+    python bench.py                    # movegen at depth 3, search at depths 3 and 5
+    python bench.py --search-depths 4 6 --expect 1234567
+
+The total number of search nodes is a signature of the search: a change that
+is meant to be a pure speed-up must leave it unchanged (use --expect).
+"""
+import argparse
+import sys
+import time
+
+from bitboard import from_fen, to_board
+from brain import ASPIRATION_WINDOW, SearchState, iterative_deepening
+from perft import PERFT_REFERENCE, perft, perft_lists
+from transposition import TranspositionTable
+
+
+def bench_movegen(depth, lists=True):
+    """
+    Times perft on every reference position.
+    :return: A list of (name, nodes, bitboard_seconds, utils_seconds or None) rows
+    """
+    rows = []
+    for name, fen, _ in PERFT_REFERENCE:
+        position, player = from_fen(fen)
+        start = time.perf_counter()
+        nodes = perft(position, player, depth)
+        elapsed = time.perf_counter() - start
+        elapsed_lists = None
+        if lists:
+            start = time.perf_counter()
+            perft_lists(to_board(position), player, depth)
+            elapsed_lists = time.perf_counter() - start
+        rows.append((name, nodes, elapsed, elapsed_lists))
+    return rows
+
+
+def bench_search(depth, tt_mb=16, **switches):
+    """
+    Runs a fixed-depth search on every reference position with a fresh table.
+    :param switches: SearchState keywords, e.g. quiescence=False or null_move=True
+    :return: A list of (name, nodes, qnodes, seconds, best_move) rows; nodes include the qnodes
+    """
+    rows = []
+    for name, fen, _ in PERFT_REFERENCE:
+        position, player = from_fen(fen)
+        state = SearchState(TranspositionTable(tt_mb), **switches)
+        start = time.perf_counter()
+        best_move, _, _, _, nodes = iterative_deepening(position, player, depth, state=state)
+        rows.append((name, nodes, state.qnodes, time.perf_counter() - start, best_move))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure move generation and search speed.")
+    parser.add_argument("--movegen-depth", type=int, default=3)
+    parser.add_argument("--search-depths", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--no-lists", action="store_true", help="Skip the utils.py move generator")
+    parser.add_argument("--no-quiescence", action="store_true", help="Score the horizon without resolving captures")
+    parser.add_argument("--rich", action="store_true", help="Score leaves with the NumPy evaluation.Evaluator")
+    parser.add_argument("--no-pvs", action="store_true", help="Search every move with the full window, as before PVS")
+    parser.add_argument("--no-aspiration", action="store_true", help="Search the root with a full window")
+    parser.add_argument("--no-lmr", action="store_true", help="Search late quiet moves to full depth")
+    parser.add_argument("--no-futility", action="store_true", help="Search quiet moves near the leaves however bad they look")
+    parser.add_argument("--null-move", action="store_true", help="Switch null-move pruning on")
+    parser.add_argument("--expect", type=int, default=None, help="Fail unless the search node total equals this")
+    args = parser.parse_args()
+
+    print(f"movegen, perft depth {args.movegen_depth}")
+    for name, nodes, elapsed, elapsed_lists in bench_movegen(args.movegen_depth, not args.no_lists):
+        line = f"  {name:<12} {nodes:>9} nodes  bitboard {nodes / max(elapsed, 1e-9):>9.0f} nodes/s"
+        if elapsed_lists is not None:
+            line += f"  utils {nodes / max(elapsed_lists, 1e-9):>8.0f} nodes/s"
+        print(line)
+
+    evaluator = None
+    if args.rich:
+        from evaluation import Evaluator  # Needs NumPy
+        evaluator = Evaluator()
+    options = dict(quiescence=not args.no_quiescence, evaluator=evaluator, pvs=not args.no_pvs,
+                   aspiration=None if args.no_aspiration else ASPIRATION_WINDOW, lmr=not args.no_lmr,
+                   futility=not args.no_futility, null_move=args.null_move)
+    total_nodes, total_time = 0, 0.0
+    for depth in args.search_depths:
+        print(f"search, depth {depth}")
+        for name, nodes, qnodes, elapsed, _ in bench_search(depth, **options):
+            print(f"  {name:<12} {nodes:>9} nodes  {qnodes:>8} qnodes  {elapsed:>7.2f}s  "
+                  f"{nodes / max(elapsed, 1e-9):>9.0f} nodes/s")
+            total_nodes += nodes
+            total_time += elapsed
+    print(f"search total: {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nodes/s")
+
+    if args.expect is not None and total_nodes != args.expect:
+        print(f"node count changed: expected {args.expect}, got {total_nodes}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+ROWS, COLS = 9, 9  # Define board dimensions
+SQUARES = ROWS * COLS
+
+# A position is a pair of 81-bit integers (black, white). Bit number
+# row * 9 + col is set when that side has a piece on (row, col), so moving a
+# piece one row down is a shift left by 9 and one column right a shift left by 1.
+FULL = (1 << SQUARES) - 1
+
+ROW_MASKS = [((1 << COLS) - 1) << (row * COLS) for row in range(ROWS)]
+COL_MASKS = [sum(1 << (row * COLS + col) for row in range(ROWS)) for col in range(COLS)]
+
+# Masks that stop horizontal shifts from wrapping around to the next row
+NOT_COL_0 = FULL & ~COL_MASKS[0]
+NOT_COL_8 = FULL & ~COL_MASKS[8]
+NOT_COL_01 = NOT_COL_0 & ~COL_MASKS[1]
+NOT_COL_78 = NOT_COL_8 & ~COL_MASKS[7]
+
+BLACK_GOAL = ROW_MASKS[8]  # Black (1) wins by reaching the bottom row
+WHITE_GOAL = ROW_MASKS[0]  # White (2) wins by reaching the top row
+
+FILES = "abcdefghi"  # Column letters used in move notation
+
+# What evaluate() gives a piece of each player on each square, from White's point of
+# view. Because the evaluation is a plain sum of these, a move changes it by
+# PIECE_SQUARE[player][to] - PIECE_SQUARE[player][from], minus the captured piece's value.
+PIECE_SQUARE = [
+    None,
+    [-(ROWS - sq // COLS) for sq in range(SQUARES)],  # Black
+    [sq // COLS for sq in range(SQUARES)],  # White
+]
+
+# Alternative table: every piece is worth 10 plus one point per row it has advanced
+ADVANCEMENT_SQUARE = [
+    None,
+    [-(10 + sq // COLS) for sq in range(SQUARES)],  # Black advances downwards
+    [10 + (ROWS - 1 - sq // COLS) for sq in range(SQUARES)],  # White advances upwards
+]
+
+# Evaluation variants by name, for engine configurations
+EVALUATIONS = {
+    'default': PIECE_SQUARE,
+    'advancement': ADVANCEMENT_SQUARE,
+}
+
+
+def from_board(board):
+    """
+    Converts a list-of-lists board (as used by game.py) into a bitboard position.
+    :param board: 9x9 board with 0 for empty, 1 for black and 2 for white
+    :return: The position as a (black, white) tuple of bitboards
+    """
+    black = white = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            if board[row][col] == 1:
+                black |= 1 << (row * COLS + col)
+            elif board[row][col] == 2:
+                white |= 1 << (row * COLS + col)
+    return black, white
+
+
+def to_board(position):
+    """
+    Converts a bitboard position back into a list-of-lists board.
+    :param position: The position as a (black, white) tuple
+    :return: A new 9x9 board with 0 for empty, 1 for black and 2 for white
+    """
+    black, white = position
+    board = [[0] * COLS for _ in range(ROWS)]
+    for sq in iter_squares(black):
+        board[sq // COLS][sq % COLS] = 1
+    for sq in iter_squares(white):
+        board[sq // COLS][sq % COLS] = 2
+    return board
+
+
+def iter_squares(bb):
+    """Yields the square index of every set bit, lowest first."""
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def square_to_coords(sq):
+    return divmod(sq, COLS)
+
+
+def coords_to_square(coords):
+    row, col = coords
+    return row * COLS + col
+
+
+def move_to_coords(move):
+    """Converts a (from_sq, to_sq) move into ((start_row, start_col), (end_row, end_col))."""
+    return divmod(move[0], COLS), divmod(move[1], COLS)
+
+
+def move_from_coords(move):
+    """Converts ((start_row, start_col), (end_row, end_col)) into a (from_sq, to_sq) move."""
+    return coords_to_square(move[0]), coords_to_square(move[1])
+
+
+def move_to_notation(move):
+    """
+    Writes a move the way game.index_to_notation does: columns a-i, rows 1-9
+    counted from the bottom, and 'x' between the squares of a capture.
+    """
+    (start_row, start_col), (end_row, end_col) = move_to_coords(move)
+    separator = "x" if is_capture(move) else "-"
+    return f"{FILES[start_col]}{ROWS - start_row}{separator}{FILES[end_col]}{ROWS - end_row}"
+
+
+def move_from_notation(text):
+    """
+    Parses a move such as "d4-d5", "c3xe5" or "d4d5".
+    :return: The (from_sq, to_sq) move
+    :raises ValueError: If the text isn't a pair of squares
+    """
+    text = text.strip().lower().replace("-", "").replace("x", "")
+    if (len(text) != 4 or text[0] not in FILES or text[2] not in FILES
+            or not text[1].isdigit() or not text[3].isdigit() or "0" in (text[1], text[3])):
+        raise ValueError(f"Invalid move: {text!r}")
+    start = (ROWS - int(text[1]), FILES.index(text[0]))
+    end = (ROWS - int(text[3]), FILES.index(text[2]))
+    return coords_to_square(start), coords_to_square(end)
+
+
+def to_fen(position, player):
+    """
+    Writes a position as a FEN-like string: rows from top (row 0) to bottom
+    separated by '/', 'b' and 'w' for pieces, digits for runs of empty squares,
+    then the player to move.
+    """
+    rows = []
+    for row in to_board(position):
+        text, empty = "", 0
+        for cell in row:
+            if cell == 0:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += "b" if cell == 1 else "w"
+        rows.append(text + (str(empty) if empty else ""))
+    return "/".join(rows) + (" w" if player == 2 else " b")
+
+
+def from_fen(fen):
+    """
+    Parses a string written by to_fen.
+    :return: (position, player)
+    :raises ValueError: If the string is malformed
+    """
+    parts = fen.split()
+    if len(parts) != 2 or parts[1] not in ("b", "w"):
+        raise ValueError(f"Invalid FEN, expected '<rows> <b|w>': {fen!r}")
+    rows = parts[0].split("/")
+    if len(rows) != ROWS:
+        raise ValueError(f"Invalid FEN, expected {ROWS} rows: {fen!r}")
+    board = []
+    for text in rows:
+        row = []
+        for char in text:
+            if char.isdigit():
+                row.extend([0] * int(char))
+            elif char in "bw":
+                row.append(1 if char == "b" else 2)
+            else:
+                raise ValueError(f"Invalid FEN character {char!r}: {fen!r}")
+        if len(row) != COLS:
+            raise ValueError(f"Invalid FEN, expected {COLS} squares per row: {fen!r}")
+        board.append(row)
+    return from_board(board), 2 if parts[1] == "w" else 1
+
+
+def is_capture(move):
+    # Steps are +-1 or +-9, jumps are +-16 or +-20
+    return not -COLS <= move[1] - move[0] <= COLS
+
+
+def _append_moves(moves, targets, delta):
+    # Every target square was reached by shifting the source square by delta
+    while targets:
+        lsb = targets & -targets
+        to = lsb.bit_length() - 1
+        moves.append((to - delta, to))
+        targets ^= lsb
+
+
+def generate_captures(position, player):
+    """
+    Generates all capturing jumps for the given player.
+    :param position: The position as a (black, white) tuple
+    :param player: The player to move (1 for black, 2 for white)
+    :return: A list of (from_sq, to_sq) moves
+    """
+    black, white = position
+    empty = FULL & ~(black | white)
+    moves = []
+    if player == 1:  # Black jumps diagonally downwards
+        _append_moves(moves, ((((black & NOT_COL_78) << 10) & white) << 10) & empty, 20)
+        _append_moves(moves, ((((black & NOT_COL_01) << 8) & white) << 8) & empty, 16)
+    else:  # White jumps diagonally upwards
+        _append_moves(moves, ((((white & NOT_COL_01) >> 10) & black) >> 10) & empty, -20)
+        _append_moves(moves, ((((white & NOT_COL_78) >> 8) & black) >> 8) & empty, -16)
+    return moves
+
+
+def has_winning_step(position, player):
+    """True when the given player can step forward onto the opponent's back row."""
+    black, white = position
+    empty = FULL & ~(black | white)
+    if player == 1:
+        return bool((black << 9) & empty & BLACK_GOAL)
+    return bool((white >> 9) & empty & WHITE_GOAL)
+
+
+def generate_quiet_moves(position, player):
+    """
+    Generates all forward and sideways steps for the given player.
+    :param position: The position as a (black, white) tuple
+    :param player: The player to move (1 for black, 2 for white)
+    :return: A list of (from_sq, to_sq) moves
+    """
+    black, white = position
+    empty = FULL & ~(black | white)
+    moves = []
+    if player == 1:
+        _append_moves(moves, (black << 9) & empty, 9)
+        pieces = black
+    else:
+        _append_moves(moves, (white >> 9) & empty, -9)
+        pieces = white
+    _append_moves(moves, ((pieces & NOT_COL_8) << 1) & empty, 1)
+    _append_moves(moves, ((pieces & NOT_COL_0) >> 1) & empty, -1)
+    return moves
+
+
+def generate_moves(position, player):
+    """
+    Generates the legal moves for the given player. Captures are compulsory,
+    so when any capture exists only the captures are returned.
+    :param position: The position as a (black, white) tuple
+    :param player: The player to move (1 for black, 2 for white)
+    :return: A list of (from_sq, to_sq) moves
+    """
+    return generate_captures(position, player) or generate_quiet_moves(position, player)
+
+
+def make_move(position, move):
+    """
+    Applies a move and returns the new position. The mover is taken from the
+    piece on the start square, and a jumped piece is removed.
+    :param position: The position as a (black, white) tuple
+    :param move: The (from_sq, to_sq) move
+    :return: The new (black, white) position
+    """
+    black, white = position
+    frm, to = move
+    change = (1 << frm) | (1 << to)
+    jump = not -COLS <= to - frm <= COLS
+    if black >> frm & 1:
+        black ^= change
+        if jump:
+            white ^= 1 << ((frm + to) >> 1)
+    else:
+        white ^= change
+        if jump:
+            black ^= 1 << ((frm + to) >> 1)
+    return black, white
+
+
+def winner(position):
+    """
+    Checks whether a side has reached the opponent's back row.
+    :param position: The position as a (black, white) tuple
+    :return: 1 if black has won, 2 if white has won, otherwise None
+    """
+    black, white = position
+    if white & WHITE_GOAL:
+        return 2
+    if black & BLACK_GOAL:
+        return 1
+    return None
+
+
+def evaluate(position, piece_square=None):
+    """
+    Scores the position from White's point of view as the sum of the
+    piece-square values of all pieces.
+    :param position: The position as a (black, white) tuple
+    :param piece_square: Table to score with, PIECE_SQUARE when not given
+    :return: The score, higher is better for White
+    """
+    black, white = position
+    if piece_square is not None and piece_square is not PIECE_SQUARE:
+        return (sum(piece_square[1][sq] for sq in iter_squares(black))
+                + sum(piece_square[2][sq] for sq in iter_squares(white)))
+    # PIECE_SQUARE gives White its row and Black minus (9 - row). A piece on row r is
+    # counted once by each of the shifts by 9, 18, ... 9 * r, so these shifts add up the
+    # rows of both colours, and Black's part is 9 per piece minus its row.
+    occupied = black | white
+    return ((occupied >> 9).bit_count() + (occupied >> 18).bit_count() + (occupied >> 27).bit_count()
+            + (occupied >> 36).bit_count() + (occupied >> 45).bit_count() + (occupied >> 54).bit_count()
+            + (occupied >> 63).bit_count() + (occupied >> 72).bit_count() - ROWS * black.bit_count())
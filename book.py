@@ -0,0 +1,221 @@
+"""
+Opening book: weighted moves for positions near the start, stored as a
+sorted binary file of fixed-size records that is memory-mapped and searched
+by Zobrist key, so a book move costs a binary search instead of a search.
+
+    python book.py --search-plies 2 --depth 5 --out book.bin     # from the engine's own choices
+    python book.py --selfplay results.jsonl --max-plies 12        # from selfplay.py results
+    python book.py --show                                         # book moves in the start position
+
+File: an 8-byte header (MAGIC, VERSION, 3 padding bytes) followed by
+records of RECORD (key, from_sq, to_sq, weight), sorted by key. A position
+with several book moves has one record per move, next to each other.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict
+
+from bitboard import from_board, generate_moves, make_move, move_from_notation, move_to_notation, winner
+from transposition import TranspositionTable, hash_position
+from utils import START_POSITION
+
+MAGIC = b"FNBK"
+VERSION = 1
+HEADER = struct.Struct("<4sB3x")
+RECORD = struct.Struct("<QBBH")  # Zobrist key, from square, to square, weight
+MAX_WEIGHT = 0xFFFF
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+
+class BookBuilder:
+    """Collects weighted moves per position and writes them as a book file."""
+
+    def __init__(self):
+        self.weights = defaultdict(int)  # (key, from_sq, to_sq) -> weight
+
+    def add(self, position, player, move, weight=1):
+        """
+        Adds weight to a move.
+        :param position: The position as a (black, white) tuple
+        :param player: The player to move (1 for black, 2 for white)
+        :param move: The (from_sq, to_sq) move
+        """
+        self.weights[(hash_position(position, player), move[0], move[1])] += weight
+
+    def add_game(self, moves, winning_player, max_plies, skip_plies=0):
+        """
+        Adds the moves of a finished game from the start position: 2 for every
+        move of the winner, 1 for every move of a drawn game.
+        :param moves: The game's (from_sq, to_sq) moves
+        :param winning_player: 1, 2, or None for a draw
+        :param max_plies: Only the first this many moves are added
+        :param skip_plies: Leading moves that are played but not added, e.g. a random opening
+        """
+        position, player = from_board(START_POSITION), 2
+        for ply, move in enumerate(moves[:max_plies]):
+            if ply >= skip_plies:
+                if winning_player is None:
+                    self.add(position, player, move, 1)
+                elif winning_player == player:
+                    self.add(position, player, move, 2)
+            position, player = make_move(position, move), 3 - player
+
+    def __len__(self):
+        return len(self.weights)
+
+    def write(self, path=BOOK_PATH):
+        """Writes the book, sorted by key, heaviest move first within a position."""
+        records = sorted(((key, frm, to, min(weight, MAX_WEIGHT)) for (key, frm, to), weight in self.weights.items()),
+                         key=lambda record: (record[0], -record[3]))
+        with open(path, "wb") as handle:
+            handle.write(HEADER.pack(MAGIC, VERSION))
+            for record in records:
+                handle.write(RECORD.pack(*record))
+        return len(records)
+
+
+class OpeningBook:
+    """Looks moves up in a book file through mmap and binary search."""
+
+    def __init__(self, path=BOOK_PATH):
+        self.handle = open(path, "rb")
+        self.data = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        self.count = (len(self.data) - HEADER.size) // RECORD.size
+
+    def _key_at(self, index):
+        return struct.unpack_from("<Q", self.data, HEADER.size + index * RECORD.size)[0]
+
+    def lookup(self, position, player):
+        """
+        Finds the book moves of a position.
+        :return: A list of ((from_sq, to_sq), weight), heaviest first; empty when the position isn't in the book
+        """
+        key = hash_position(position, player)
+        low, high = 0, self.count
+        while low < high:  # First record with a key >= key
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        legal = None
+        for index in range(low, self.count):
+            record_key, frm, to, weight = RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+            if record_key != key:
+                break
+            if legal is None:
+                legal = generate_moves(position, player)
+            if (frm, to) in legal:  # Guards against a key collision with another position
+                moves.append(((frm, to), weight))
+        return moves
+
+    def choose(self, position, player, rng=None):
+        """
+        Picks a book move.
+        :param rng: Optional random.Random; moves are then chosen in proportion to their weight,
+                    otherwise the heaviest move is played
+        :return: The (from_sq, to_sq) move, or None when the position isn't in the book
+        """
+        moves = self.lookup(position, player)
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0][0]
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        self.data.close()
+        self.handle.close()
+
+
+def build_from_search(builder, plies, depth, verbose=True):
+    """
+    Adds the engine's best move in every position reachable from the start in
+    fewer than plies moves. Every reply is followed, so the book covers both sides.
+    :return: The number of positions searched
+    """
+    from brain import iterative_deepening  # brain imports this module
+
+    tt = TranspositionTable()
+    frontier = {hash_position(from_board(START_POSITION), 2): (from_board(START_POSITION), 2)}
+    searched = 0
+    for ply in range(plies):
+        next_frontier = {}
+        start = time.perf_counter()
+        for position, player in frontier.values():
+            move = iterative_deepening(position, player, depth, tt=tt)[0]
+            searched += 1
+            if move is None:
+                continue
+            builder.add(position, player, move)
+            if ply == plies - 1:
+                continue
+            for reply in generate_moves(position, player):
+                child = make_move(position, reply)
+                if winner(child) is None:
+                    next_frontier[hash_position(child, 3 - player)] = (child, 3 - player)
+        if verbose:
+            print(f"ply {ply}: {len(frontier)} positions searched in {time.perf_counter() - start:.1f}s")
+        frontier = next_frontier
+    return searched
+
+
+def load_selfplay(builder, path, max_plies):
+    """
+    Adds the games of a selfplay.py JSONL file. The random opening moves of
+    each game are played but not added.
+    :return: The number of games read
+    """
+    games = 0
+    with open(path) as handle:
+        for line in handle:
+            record = json.loads(line)
+            a_player = 2 if record['a_color'] == 'white' else 1
+            if record['result'] == 'draw':
+                winning_player = None
+            else:
+                winning_player = a_player if record['result'] == 'a' else 3 - a_player
+            moves = [move_from_notation(text) for text in record['moves']]
+            builder.add_game(moves, winning_player, max_plies, record.get('opening_plies', 0))
+            games += 1
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the opening book.")
+    parser.add_argument("--out", default=BOOK_PATH, help="Book file to write or show")
+    parser.add_argument("--search-plies", type=int, default=0, help="Search every position this many plies deep")
+    parser.add_argument("--depth", type=int, default=5, help="Search depth for --search-plies")
+    parser.add_argument("--selfplay", nargs="*", default=[], help="selfplay.py JSONL files to learn from")
+    parser.add_argument("--max-plies", type=int, default=12, help="Moves per self-play game added to the book")
+    parser.add_argument("--show", action="store_true", help="Print the book moves of the start position")
+    args = parser.parse_args()
+
+    if args.show:
+        book = OpeningBook(args.out)
+        position = from_board(START_POSITION)
+        print(f"{book.count} records")
+        for move, weight in book.lookup(position, 2):
+            print(f"{move_to_notation(move)} {weight}")
+        return
+
+    builder = BookBuilder()
+    if args.search_plies:
+        build_from_search(builder, args.search_plies, args.depth)
+    for path in args.selfplay:
+        print(f"{path}: {load_selfplay(builder, path, args.max_plies)} games")
+    if not len(builder):
+        parser.error("nothing to build, give --search-plies and/or --selfplay")
+    print(f"{builder.write(args.out)} records written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,706 @@
-from utils import make_move_for_ai, get_all_valid_moves, is_terminal, available_captures
+import os
+import time
 
+from bitboard import (BLACK_GOAL, FULL, NOT_COL_01, NOT_COL_78, ROW_MASKS, WHITE_GOAL, PIECE_SQUARE, from_board,
+                      generate_captures, has_winning_step, is_capture, make_move, move_to_coords)
+from book import BOOK_PATH, OpeningBook
+from instrumentation import SearchStats, run_profiled
+from ordering import MoveOrderer
+from searchboard import SearchBoard
+from tablebase import DRAW, MAX_DISTANCE, WIN, Tablebase
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
 
-def negamax(board, depth, alpha, beta, color):
+WIN_SCORE = 100000  # Larger than any static evaluation
+WIN_THRESHOLD = WIN_SCORE - MAX_DISTANCE - 1  # Scores at least this far from 0 are wins or losses, see tablebase_score
+MAX_DEPTH = 64  # Deepest iteration a time-limited search will start
+CHECK_INTERVAL = 1024  # Nodes searched between reads of the clock
+NODE_INTERVAL = 100000  # Default nodes between on_nodes callbacks
+ASPIRATION_WINDOW = 10  # Half-width of the root window around the previous iteration's score, about a piece
+
+# Selective search, see SearchState. Nodes with captures are never reduced or pruned.
+SELECTIVE_SEARCH = ('lmr', 'futility', 'null_move')
+LMR_MIN_DEPTH = 3  # Shallowest node whose late moves are reduced
+LMR_MIN_MOVES = 3  # Moves searched at full depth first: the TT/PV move and the killers
+LMR_LATE_MOVES = 8  # From here on quiet moves are reduced by two plies instead of one
+FUTILITY_MARGINS = (0, 0, 2, 4)  # Indexed by depth, in captures (the most one capture changes the score)
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_PIECES = 5  # With fewer pieces, or fewer moves, being forced to move can lose: no null move
+NULL_MOVE_MIN_MOVES = 6
+# Squares two rows or less before each player's back row; moves onto them are never reduced or pruned
+NEAR_GOAL = [0, ROW_MASKS[6] | ROW_MASKS[7], ROW_MASKS[1] | ROW_MASKS[2]]
+
+_default_tt = None  # Shared by ai_move calls that don't pass their own table
+_default_tablebase = None  # Tables in tablebase.TABLEBASE_DIR, opened on first use
+_default_book = None  # book.BOOK_PATH, opened on first use; False when there is no book
+
+
+class SearchAborted(Exception):
+    """Raised inside the search tree when the time budget has run out or a stop was requested."""
+
+
+class SearchState:
+    """Bookkeeping shared by every node of one search."""
+
+    def __init__(self, tt=None, deadline=None, stop=None, quiescence=True, evaluator=None, tablebase=None,
+                 on_nodes=None, node_interval=NODE_INTERVAL, pvs=True, aspiration=ASPIRATION_WINDOW, lmr=True,
+                 futility=True, null_move=False):
+        """
+        :param tt: Optional TranspositionTable used to cache results
+        :param deadline: time.perf_counter() value at which the search gives up, or None
+        :param stop: Optional threading/multiprocessing Event that aborts the search when set
+        :param quiescence: Resolve pending captures at the horizon instead of scoring the position as it stands
+        :param evaluator: Optional evaluation.Evaluator that scores leaves in batches instead of the
+                          board's incremental piece-square score
+        :param tablebase: Optional tablebase.Tablebase probed in positions with few pieces
+        :param on_nodes: Optional callback(state) run about every node_interval nodes
+        :param node_interval: Nodes between on_nodes calls, checked every CHECK_INTERVAL nodes
+        :param pvs: Principal variation search: moves after the first are searched with a null
+                    window and only searched again when they beat alpha
+        :param aspiration: Half-width of the aspiration window at the root, or None for a full window
+        :param lmr: Late move reductions: quiet moves late in the ordering are searched shallower
+                    and only searched to full depth again when they beat alpha
+        :param futility: Skip quiet moves near the leaves whose static score is too far below alpha
+                         for the remaining depth to make up
+        :param null_move: Let the side to move pass; if the reduced search still fails high the node is cut
+        """
+        self.tt = tt
+        self.deadline = deadline
+        self.stop = stop
+        self.quiescence = quiescence
+        self.evaluator = evaluator
+        self.tablebase = tablebase
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.lmr = lmr
+        self.futility = futility
+        self.null_move = null_move
+        self.tb_hits = 0  # Nodes answered by the tablebase
+        self.researches = 0  # Null-window searches that failed high and were searched again
+        self.aspiration_researches = 0  # Root searches repeated after falling outside the window
+        self.reductions = 0  # Moves searched with a late move reduction
+        self.reduction_researches = 0  # Reduced moves that beat alpha and were searched to full depth
+        self.futility_pruned = 0  # Moves skipped by futility pruning
+        self.null_cutoffs = 0  # Nodes cut by a null move
+        self.tt_probes = 0
+        self.tt_hits = 0  # Probes that found an entry
+        self.tt_cutoffs = 0  # Probes whose entry answered the node
+        self.on_nodes = on_nodes
+        self.node_interval = node_interval
+        self.next_milestone = node_interval
+        self.nodes = 0  # All nodes, including quiescence nodes
+        self.qnodes = 0  # Nodes searched by quiescence()
+        self.delta_pruned = 0  # Captures skipped by delta pruning
+        self.next_check = CHECK_INTERVAL  # Node count at which the clock is next read
+        self.root_ply = 0  # Length of the board's move stack at the root
+        self.pv = []  # Principal variation of the last completed iteration
+        self.follow_pv = False  # True while the current path still matches self.pv
+        self.orderer = MoveOrderer()
+
+
+def get_default_tt():
+    """Returns the module-wide transposition table, creating it on first use."""
+    global _default_tt
+    if _default_tt is None:
+        _default_tt = TranspositionTable()
+    return _default_tt
+
+
+def get_default_tablebase():
+    """Returns the tables in tablebase.TABLEBASE_DIR, or None when none have been generated."""
+    global _default_tablebase
+    if _default_tablebase is None:
+        _default_tablebase = Tablebase()
+    return _default_tablebase or None
+
+
+def resolve_tablebase(tablebase, use_tablebase=True):
+    """The tablebase to probe: tablebase, the default tables when it is None, or None when switched off."""
+    if not use_tablebase or tablebase is False:
+        return None
+    return get_default_tablebase() if tablebase is None else tablebase
+
+
+def get_default_book():
+    """Returns the opening book at book.BOOK_PATH, or None when none has been built."""
+    global _default_book
+    if _default_book is None:
+        _default_book = OpeningBook() if os.path.exists(BOOK_PATH) else False
+    return _default_book or None
+
+
+def resolve_book(book, use_book=True):
+    """The opening book to play from: book, the default one when book is None, or None when switched off."""
+    if not use_book or book is False:
+        return None
+    return get_default_book() if book is None else book
+
+
+def tablebase_score(entry, depth):
     """
-    NegaMax with Alpha-Beta pruning.
-    :param board: The current game board
+    Converts a tablebase (result, distance) into a search score that ranks like
+    the wins and losses the search finds itself, quicker wins scoring higher.
+    :param depth: Remaining depth at the node
+    """
+    result, distance = entry
+    if result == DRAW:
+        return 0
+    score = WIN_SCORE + depth - distance
+    return score if result == WIN else -score
+
+
+def score_to_tt(score, depth):
+    """
+    Makes a win or loss score relative to the node before it is stored. Such
+    scores carry the remaining depth of the node where the game ended, which
+    only ranks wins correctly seen from the node that found them.
+    """
+    if score >= WIN_THRESHOLD:
+        return score - depth
+    if score <= -WIN_THRESHOLD:
+        return score + depth
+    return score
+
+
+def score_from_tt(score, depth):
+    """Takes back score_to_tt for a node with the given remaining depth."""
+    if score >= WIN_THRESHOLD - MAX_DEPTH:
+        return score + depth
+    if score <= -(WIN_THRESHOLD - MAX_DEPTH):
+        return score - depth
+    return score
+
+
+def has_forcing_move(black, white, player):
+    """True when player has a capture or a step onto the back row, the moves quiescence() looks at."""
+    if player == 1:
+        targets = (((((black & NOT_COL_78) << 10) & white) << 10)
+                   | ((((black & NOT_COL_01) << 8) & white) << 8)
+                   | ((black << 9) & BLACK_GOAL))
+    else:
+        targets = (((((white & NOT_COL_01) >> 10) & black) >> 10)
+                   | ((((white & NOT_COL_78) >> 8) & black) >> 8)
+                   | ((white >> 9) & WHITE_GOAL))
+    return bool(targets & ~(black | white) & FULL)
+
+
+def check_abort(state):
+    """Reads the clock and the stop event, raising SearchAborted when the search has to end."""
+    state.next_check = state.nodes + CHECK_INTERVAL
+    if state.on_nodes is not None and state.nodes >= state.next_milestone:
+        state.next_milestone = state.nodes + state.node_interval
+        state.on_nodes(state)
+    if state.deadline is not None and time.perf_counter() >= state.deadline:
+        raise SearchAborted
+    if state.stop is not None and state.stop.is_set():
+        raise SearchAborted
+
+
+def quiescence(board, alpha, beta, state, static=None):
+    """
+    Searches the forced captures left at the horizon, so positions are only
+    scored once no capture is pending. Captures are compulsory, so the side to
+    move can only stand pat when it has none; a side that can step onto the
+    back row at that point wins.
+    :param board: SearchBoard holding the position and the player to move
+    :param alpha: The alpha value for pruning
+    :param beta: The beta value for pruning
+    :param state: SearchState holding the deadline and node counts
+    :param static: The position's evaluation (White's point of view) when the caller already has it
+    :return: The best score for the side to move
+    """
+    state.nodes += 1
+    state.qnodes += 1
+    if state.nodes >= state.next_check:
+        check_abort(state)
+
+    if board.black & BLACK_GOAL or board.white & WHITE_GOAL:
+        return -WIN_SCORE  # The previous move reached the back row
+    player = board.player
+    color = 1 if player == 2 else -1
+    position = board.black, board.white
+    evaluator = state.evaluator
+    captures = generate_captures(position, player)
+    if not captures:
+        if has_winning_step(position, player):
+            return WIN_SCORE
+        # Stand pat, nothing is forced
+        if evaluator is None:
+            return color * board.score
+        return color * (evaluator.evaluate(position) if static is None else static)
+
+    goal = BLACK_GOAL if player == 1 else WHITE_GOAL
+    if evaluator is None:
+        margin, estimates = board.max_value, None
+    else:
+        margin, estimates = evaluator.margin, evaluator.score_children(position, captures)
+    best_score = float('-inf')
+    for index, move in enumerate(captures):
+        if (1 << move[1]) & goal:
+            return WIN_SCORE
+        # Delta pruning: a capture that stays below alpha even if the exchange
+        # goes on to win another piece isn't searched
+        estimate = color * (board.score_after(move) if estimates is None else estimates[index]) + margin
+        if estimate <= alpha:
+            state.delta_pruned += 1
+            if estimate > best_score:
+                best_score = estimate
+            continue
+        board.do_move(move)
+        try:
+            score = -quiescence(board, -beta, -alpha, state, None if estimates is None else estimates[index])
+        finally:
+            board.undo_move()
+        if score > best_score:
+            best_score = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return best_score
+
+
+def negamax(board, depth, alpha, beta, state=None, pv=None):
+    """
+    NegaMax with Alpha-Beta pruning. Moves are made and taken back on the board
+    in place, so the board is unchanged when this returns.
+    :param board: SearchBoard holding the position and the player to move
     :param depth: The depth of the search
     :param alpha: The alpha value for pruning
     :param beta: The beta value for pruning
-    :param color: 1 for maximizing player, -1 for minimizing player
-    :return: The best score for the current player
+    :param state: SearchState holding the transposition table, deadline and node count
+    :param pv: Optional list that receives the principal variation from this node
+    :return: The best score for the side to move
     """
-    if depth == 0 or is_terminal(board):
-        return color * evaluate(board)  # Return the evaluation of the board for the current player
+    if state is None:
+        state = SearchState()
+    if depth == 0 and state.quiescence:
+        return quiescence(board, alpha, beta, state)
+    state.nodes += 1
+    if state.nodes >= state.next_check:
+        check_abort(state)
+
+    if board.black & BLACK_GOAL or board.white & WHITE_GOAL:
+        # The previous move reached the back row, so the side to move has lost.
+        # Adding the remaining depth makes the search prefer the quickest win.
+        return -(WIN_SCORE + depth)
+    player = board.player
+    color = 1 if player == 2 else -1  # White is maximizing, Black is minimizing
+    tablebase = state.tablebase
+    if tablebase is not None and board.counts[1] + board.counts[2] <= tablebase.max_pieces:
+        entry = tablebase.probe((board.black, board.white), player)
+        if entry is not None:
+            state.tb_hits += 1
+            if pv is not None:
+                pv[:] = []
+            return tablebase_score(entry, depth)
+    if depth == 0:
+        # Return the evaluation of the board for the current player
+        if state.evaluator is not None:
+            return color * state.evaluator.evaluate((board.black, board.white))
+        return color * board.score
+
+    moves = board.moves()
+    if not moves:
+        return -(WIN_SCORE + depth)  # A player who cannot move loses
 
     max_score = float('-inf')
+    best_move = None
+    if depth == 1:
+        # Frontier node: the incremental evaluation gives every child's score
+        # without making the move, so leaves cost no more than a few additions.
+        # Only children that leave the opponent a forced capture or a winning
+        # step are made and handed to quiescence().
+        state.nodes += len(moves)
+        goal = BLACK_GOAL if player == 1 else WHITE_GOAL
+        values = board.piece_square[player]
+        opponent = 3 - player
+        opponent_values = board.piece_square[opponent]
+        base = board.score
+        black, white = board.black, board.white
+        quiescence_on = state.quiescence
+        evaluator = state.evaluator
+        if evaluator is None:
+            margin, child_scores = board.max_value, None
+        else:
+            # One vectorized call scores every child
+            margin, child_scores = evaluator.margin, evaluator.score_children((black, white), moves)
+        for index, move in enumerate(moves):
+            frm, to = move
+            if (1 << to) & goal:
+                max_score, best_move = WIN_SCORE, move  # This move wins on the spot
+                break
+            jump = not -9 <= to - frm <= 9
+            if child_scores is None:
+                score = base + values[to] - values[frm]
+                if jump:
+                    score -= opponent_values[(frm + to) >> 1]
+            else:
+                score = child_scores[index]
+            score *= color
+            if quiescence_on and score + margin > alpha:
+                change = (1 << frm) | (1 << to)
+                removed = (1 << ((frm + to) >> 1)) if jump else 0
+                if player == 1:
+                    child_black, child_white = black ^ change, white ^ removed
+                    # Squares White could land on with a capture or a winning step
+                    targets = (((((child_white & NOT_COL_01) >> 10) & child_black) >> 10)
+                               | ((((child_white & NOT_COL_78) >> 8) & child_black) >> 8)
+                               | ((child_white >> 9) & WHITE_GOAL))
+                else:
+                    child_black, child_white = black ^ removed, white ^ change
+                    targets = (((((child_black & NOT_COL_78) << 10) & child_white) << 10)
+                               | ((((child_black & NOT_COL_01) << 8) & child_white) << 8)
+                               | ((child_black << 9) & BLACK_GOAL))
+                if targets & ~(child_black | child_white) & FULL:
+                    state.nodes -= 1  # Counted again by quiescence()
+                    board.do_move(move)
+                    try:
+                        score = -quiescence(board, -beta, -max(alpha, max_score), state,
+                                            None if child_scores is None else child_scores[index])
+                    finally:
+                        board.undo_move()
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if score >= beta:
+                    break
+        if pv is not None:
+            pv[:] = [best_move]
+        return max_score
 
-    # Generate all possible valid moves
-    for move in get_all_valid_moves(board, color):
-        new_board = make_move_for_ai(board, move[0], move[1])
-        score = -negamax(new_board, depth - 1, -beta, -alpha, -color)  # Switch player and negate score
-        max_score = max(max_score, score)
-        alpha = max(alpha, score)
-        if alpha >= beta:
-            break  # Beta cutoff (prune branch)
+    tt = state.tt
+    key = board.key
+    first_move = None
+    if tt is not None:
+        state.tt_probes += 1
+        entry = tt.probe(key)
+        if entry is not None:
+            state.tt_hits += 1
+            entry_depth, entry_score, bound, first_move = entry
+            entry_score = score_from_tt(entry_score, depth)
+            if entry_depth >= depth and not state.follow_pv:
+                if (bound == EXACT or (bound == LOWER and entry_score >= beta)
+                        or (bound == UPPER and entry_score <= alpha)):
+                    state.tt_cutoffs += 1
+                    return entry_score
 
-    return max_score
+    ply = len(board.stack) - state.root_ply  # Not root depth - depth, reductions skip plies
+    on_pv = state.follow_pv
+    if on_pv:
+        if ply < len(state.pv) and state.pv[ply] in moves:
+            first_move = state.pv[ply]  # The previous iteration's best line is searched first
+        else:
+            state.follow_pv = on_pv = False
+    quiet = not is_capture(moves[0])  # Captures are compulsory, so either every move captures or none does
+    pv_node = beta - alpha > 1
 
+    if (state.null_move and quiet and not pv_node and not on_pv and depth >= NULL_MOVE_MIN_DEPTH
+            and abs(beta) < WIN_SCORE and board.counts[player] >= NULL_MOVE_MIN_PIECES
+            and len(moves) >= NULL_MOVE_MIN_MOVES and not (board.stack and board.stack[-1][0] is None)
+            and color * (board.score if state.evaluator is None
+                         else state.evaluator.evaluate((board.black, board.white))) >= beta):
+        # Null move: if the opponent can't get below beta even when we pass, a real
+        # move would fail high too. Never twice in a row, and not with few pieces or
+        # moves, where having to move can be what loses (zugzwang).
+        board.do_null_move()
+        try:
+            score = -negamax(board, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, state)
+        finally:
+            board.undo_null_move()
+        if score >= beta:
+            state.null_cutoffs += 1
+            return beta  # Not the score itself, a win found after passing isn't real
 
-def ai_move(board, current_player, depth=3, rows=9, cols=9):
-    best_score = float('-inf')
-    best_move = None
+    state.orderer.order(moves, ply, player, first_move)
+    alpha_orig = alpha
 
-    color = 1 if current_player == 2 else -1  # White is maximizing, Black is minimizing
+    futility_limit = None
+    if state.futility and quiet and not pv_node and depth < len(FUTILITY_MARGINS) and abs(alpha) < WIN_SCORE:
+        evaluator = state.evaluator
+        futility_margin = FUTILITY_MARGINS[depth] * (board.max_value if evaluator is None else evaluator.margin)
+        futility_limit = alpha - futility_margin  # Quiet moves whose static score is no higher are skipped
+        child_scores = None if evaluator is None else evaluator.score_children((board.black, board.white), moves)
+    reduce = state.lmr and quiet and depth >= LMR_MIN_DEPTH
+    near_goal = NEAR_GOAL[player]
 
-    # First, check if any captures are available
-    captures = available_captures(board, current_player)
+    child_pv = None
+    pvs = state.pvs
+    for index, move in enumerate(moves):
+        if pv is not None:
+            child_pv = []
+        # Late or hopeless quiet moves, unless they run for the back row
+        selective = index and (reduce or futility_limit is not None) and not (1 << move[1]) & near_goal
+        if selective and futility_limit is not None:
+            static = color * (board.score_after(move) if child_scores is None else child_scores[index])
+            if static <= futility_limit and not has_forcing_move(*make_move((board.black, board.white), move),
+                                                                  3 - player):
+                state.futility_pruned += 1
+                if static + futility_margin > max_score:
+                    max_score = static + futility_margin  # Upper bound on what the move could have scored
+                continue
+        board.do_move(move)
+        try:
+            full_depth = True
+            if (selective and reduce and index >= LMR_MIN_MOVES
+                    and not has_forcing_move(board.black, board.white, board.player)):
+                # Late move reduction, except for moves that leave the opponent a capture or a win
+                state.reductions += 1
+                reduction = 2 if index >= LMR_LATE_MOVES and depth > LMR_MIN_DEPTH else 1
+                score = -negamax(board, depth - 1 - reduction, -alpha - 1, -alpha, state, child_pv)
+                full_depth = score > alpha
+                if full_depth:
+                    state.reduction_researches += 1
+                    if child_pv is not None:
+                        child_pv = []
+            if full_depth:  # Otherwise the reduced search showed the move is no better than alpha
+                if pvs and index and beta - alpha > 1:
+                    # Principal variation search: the first move is expected to be best, so the
+                    # others only have to be proven no better with a null window around alpha
+                    score = -negamax(board, depth - 1, -alpha - 1, -alpha, state, child_pv)
+                    if alpha < score < beta:
+                        state.researches += 1
+                        if child_pv is not None:
+                            child_pv = []
+                        score = -negamax(board, depth - 1, -beta, -alpha, state, child_pv)
+                else:
+                    score = -negamax(board, depth - 1, -beta, -alpha, state, child_pv)  # Switch player and negate score
+        finally:
+            board.undo_move()  # Keep the board intact even when the search is aborted
+        if on_pv:
+            state.follow_pv = on_pv = False  # Only the first child continues the previous PV
+        if score > max_score:
+            max_score = score
+            best_move = move
+            if score > alpha:
+                alpha = score
+                if pv is not None:
+                    pv[:] = [move] + child_pv
+                if alpha >= beta:
+                    state.orderer.record_cutoff(move, ply, depth, index, is_capture(move))
+                    break  # Beta cutoff (prune branch)
 
-    # Generate all possible moves (restrict to captures if they exist)
-    if captures:
-        possible_moves = captures  # AI must make a capture move
-    else:
-        possible_moves = get_all_valid_moves(board, current_player)  # Regular moves if no captures
+    if tt is not None:
+        if max_score <= alpha_orig:
+            bound = UPPER
+        elif max_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        tt.store(key, depth, score_to_tt(max_score, depth), bound, best_move)
+    return max_score
 
-    # Iterate over possible moves
-    for move in possible_moves:
-        new_board = make_move_for_ai(board, move[0], move[1])
-        score = -negamax(new_board, depth - 1, float('-inf'), float('inf'), -color)
 
+def search_root(board, depth, state, alpha=float('-inf'), beta=float('inf')):
+    """
+    Searches every root move to the given depth. With state.pvs, alpha is
+    carried from move to move and later moves get a null window; otherwise
+    every move gets the full window.
+    :param alpha: Lower end of the root window
+    :param beta: Upper end of the root window
+    :return: (best_score, best_move, pv); a best_score <= alpha or >= beta is only a bound
+    """
+    state.root_ply = len(board.stack)
+    state.follow_pv = bool(state.pv)
+
+    # Captures are compulsory, so moves() only returns captures when there are any
+    moves = board.moves()
+    state.orderer.order(moves, 0, board.player, state.pv[0] if state.pv else None)
+
+    pvs = state.pvs
+    best_score = float('-inf')
+    best_move = None
+    best_pv = []
+    for move in moves:
+        child_pv = []
+        board.do_move(move)
+        try:
+            if not pvs:
+                score = -negamax(board, depth - 1, float('-inf'), float('inf'), state, child_pv)
+            elif best_move is None:
+                score = -negamax(board, depth - 1, -beta, -alpha, state, child_pv)
+            else:
+                score = -negamax(board, depth - 1, -alpha - 1, -alpha, state, child_pv)
+                if alpha < score < beta:
+                    state.researches += 1
+                    child_pv = []
+                    score = -negamax(board, depth - 1, -beta, -alpha, state, child_pv)
+        finally:
+            board.undo_move()
+        state.follow_pv = False
         if score > best_score:
             best_score = score
             best_move = move
+            best_pv = [move] + child_pv
+            if pvs and score > alpha:
+                alpha = score
+                if score >= beta:
+                    break  # Failed high, the caller widens the window
+    return best_score, best_move, best_pv
+
+
+def iterative_deepening(position, current_player, depth=3, time_limit_ms=None, tt=None, stop=None, on_iteration=None,
+                        piece_square=PIECE_SQUARE, quiescence=True, evaluator=None, tablebase=None, state=None):
+    """
+    Searches depth 1, 2, 3... Each iteration searches the previous one's
+    principal variation first.
+    :param position: The position as a (black, white) tuple of bitboards
+    :param current_player: The player to move (1 for black, 2 for white)
+    :param depth: The final depth when there is no time limit
+    :param time_limit_ms: Time budget in milliseconds; when given, iterations continue until it
+                          runs out and the result of the last completed one is returned
+    :param tt: Optional TranspositionTable
+    :param stop: Optional Event; setting it ends the search with the last completed iteration
+    :param on_iteration: Optional callback(depth, score, best_move, pv, nodes) run after every completed iteration
+    :param piece_square: Evaluation table, one of bitboard.EVALUATIONS
+    :param quiescence: Resolve forced captures past the final depth, see quiescence()
+    :param evaluator: Optional evaluation.Evaluator that scores leaves instead of piece_square
+    :param tablebase: Optional tablebase.Tablebase; a root position in the tables is answered from them
+    :param state: Optional SearchState to search with, to read its counters afterwards;
+                  when given, it replaces tt, stop, quiescence, evaluator and tablebase
+    :return: (best_move, score, pv, depth_reached, nodes) with moves as (from_sq, to_sq)
+    """
+    start = time.perf_counter()
+    if state is None:
+        state = SearchState(tt, stop=stop, quiescence=quiescence, evaluator=evaluator, tablebase=tablebase)
+    tt = state.tt
+    if state.tablebase is not None:
+        found = state.tablebase.best_move(position, current_player)
+        if found is not None:
+            state.tb_hits += 1
+            move, entry = found
+            return move, tablebase_score(entry, 0), [move] if move else [], 0, 0
+    if tt is not None:
+        tt.new_search()
+    board = SearchBoard(position, current_player, piece_square)
+
+    moves = board.moves()
+    if not moves:
+        return None, -WIN_SCORE, [], 0, 0
+    best_move, best_score, depth_reached = moves[0], None, 0
+    if time_limit_ms is not None and len(moves) == 1:
+        return best_move, None, [best_move], 0, 0  # Forced move, nothing to think about
 
-    return best_move
+    final_depth = MAX_DEPTH if time_limit_ms is not None else depth
+    for current_depth in range(1, final_depth + 1):
+        if time_limit_ms is not None and current_depth > 1:
+            # Depth 1 always completes so there is a move to play
+            state.deadline = start + time_limit_ms / 1000
+        alpha, beta = float('-inf'), float('inf')
+        if state.pvs and state.aspiration and best_score is not None and abs(best_score) < WIN_SCORE:
+            # Aspiration window: expect about the previous iteration's score
+            alpha, beta = best_score - state.aspiration, best_score + state.aspiration
+        try:
+            while True:
+                score, move, pv = search_root(board, current_depth, state, alpha, beta)
+                if score <= alpha:
+                    alpha = float('-inf')  # Failed low, search again with the lower side open
+                elif score >= beta:
+                    beta = float('inf')  # Failed high
+                else:
+                    break
+                state.aspiration_researches += 1
+        except SearchAborted:
+            break
+        best_score, best_move, state.pv, depth_reached = score, move, pv, current_depth
+        if on_iteration is not None:
+            on_iteration(current_depth, score, move, pv, state.nodes)
+        if abs(score) >= WIN_SCORE:
+            break  # A forced win or loss was found, deeper searches can't change it
+        if time_limit_ms is not None and (time.perf_counter() - start) * 1000 * 2 > time_limit_ms:
+            break  # The next iteration would almost certainly not finish in time
+    return best_move, best_score, state.pv, depth_reached, state.nodes
 
 
-def evaluate(board):
-    white_score = 0
-    black_score = 0
-    for row in range(ROWS):
-        for col in range(COLS):
-            if board[row][col] == 1:  # Black pieces
-                black_score += (ROWS - row)  # Reward advancing towards opponent's row
-            elif board[row][col] == 2:  # White pieces
-                white_score += row  # Reward advancing towards opponent's row
-    return white_score - black_score  # Higher score is better for White
+def analyse(position, current_player, depth=3, time_limit_ms=None, tt=None, stop=None, on_iteration=None,
+            on_nodes=None, node_interval=NODE_INTERVAL, profile=None, **options):
+    """
+    Runs iterative_deepening and reports what it did.
+    :param on_iteration: Optional callback(stats) run after every completed iteration, with the
+                         SearchStats so far
+    :param on_nodes: Optional callback(state) run about every node_interval nodes with the live SearchState
+    :param profile: None, 'cprofile' or 'sample' to profile the search, see instrumentation.run_profiled
+    :param options: Further iterative_deepening keywords (piece_square, quiescence, evaluator, tablebase)
+    :return: instrumentation.SearchStats, including the best move
+    """
+    state = SearchState(tt, stop=stop, quiescence=options.pop('quiescence', True),
+                        evaluator=options.pop('evaluator', None), tablebase=options.pop('tablebase', None),
+                        on_nodes=on_nodes, node_interval=node_interval)
+    iterations = []
+    start = time.perf_counter()
+
+    def record(current_depth, score, move, pv, nodes):
+        elapsed = time.perf_counter() - start
+        iterations.append((current_depth, score, nodes, elapsed))
+        if on_iteration is not None:
+            stats = SearchStats.from_state(state, move, score, pv, current_depth, elapsed)
+            stats.iterations = list(iterations)
+            on_iteration(stats)
+
+    (best_move, score, pv, depth_reached, _), report = run_profiled(
+        lambda: iterative_deepening(position, current_player, depth, time_limit_ms, on_iteration=record, state=state,
+                                    **options), profile)
+    stats = SearchStats.from_state(state, best_move, score, pv, depth_reached, time.perf_counter() - start)
+    stats.iterations = iterations
+    stats.profile = report
+    return stats
+
+
+def ai_move(board, current_player, depth=3, rows=9, cols=9, tt=None, time_limit_ms=None, workers=1,
+            parallel_strategy='lazy', tablebase=None, book=None, return_stats=False, profile=None, on_iteration=None,
+            on_nodes=None, node_interval=NODE_INTERVAL, use_book=True, use_tablebase=True):
+    """
+    Picks a move for the current player.
+    :param board: The current game board as a list of lists
+    :param current_player: The player to move (1 for black, 2 for white)
+    :param depth: The search depth in plies, ignored when time_limit_ms is given
+    :param tt: TranspositionTable to use; pass one per game to keep results between moves,
+               otherwise a module-wide table is used. Parallel searches keep their own tables.
+    :param time_limit_ms: Optional time budget; the search deepens until it runs out
+    :param workers: Number of processes to search with; more than 1 uses parallel.py
+    :param parallel_strategy: 'lazy' (Lazy SMP with a shared table) or 'root' (root moves split between workers)
+    :param tablebase: Tablebase to probe when few pieces are left; the generated tables in
+                      tablebase.TABLEBASE_DIR are used when not given
+    :param book: OpeningBook whose moves are played without searching; the one at book.BOOK_PATH
+                 is used when not given
+    :param return_stats: Also return an instrumentation.SearchStats describing the search
+    :param profile: None, 'cprofile' or 'sample' to profile the search into stats.profile
+    :param on_iteration: Optional callback(stats) run after every completed iteration, see analyse()
+    :param on_nodes: Optional callback(state) run about every node_interval nodes, see analyse();
+                     neither callback is run by parallel searches, whose nodes are in other processes
+    :param use_book: False to search every move; book=False does the same
+    :param use_tablebase: False to search without tablebases; tablebase=False does the same
+    :return: The best move as ((start_row, start_col), (end_row, end_col)), or None if there is no legal move;
+             with return_stats, a (move, stats) tuple
+    """
+    start = time.perf_counter()
+    position = from_board(board)
+    book = resolve_book(book, use_book)
+    tablebase = resolve_tablebase(tablebase, use_tablebase)
+    book_move = book.choose(position, current_player) if book is not None else None
+    if book_move is not None:
+        best_move, stats = book_move, SearchStats('book')
+        stats.best_move, stats.pv = book_move, [book_move]
+    elif workers > 1:
+        found = tablebase.best_move(position, current_player) if tablebase is not None else None
+        if found is not None:
+            best_move, stats = found[0], SearchStats('tablebase')
+            stats.best_move, stats.tb_hits = best_move, 1
+        else:
+            from parallel import get_searcher  # parallel imports this module
+            searcher = get_searcher(workers, parallel_strategy)
+            (best_move, score, pv, depth_reached, nodes), report = run_profiled(
+                lambda: searcher.search(position, current_player, depth, time_limit_ms), profile)
+            # Only the totals come back from the worker processes
+            stats = SearchStats()
+            stats.best_move, stats.score, stats.pv, stats.depth, stats.nodes = best_move, score, pv, depth_reached, nodes
+            stats.profile = report
+    else:
+        if tt is None:
+            tt = get_default_tt()
+        stats = analyse(position, current_player, depth, time_limit_ms, tt, on_iteration=on_iteration, on_nodes=on_nodes,
+                        node_interval=node_interval, tablebase=tablebase, profile=profile)
+        best_move = stats.best_move
+    stats.elapsed = time.perf_counter() - start
+    coords = move_to_coords(best_move) if best_move else None
+    return (coords, stats) if return_stats else coords
@@ -0,0 +1,186 @@
+"""
+Headless Fianco engine speaking a UCI-style line protocol on stdin/stdout.
+It never imports pygame, so match servers can start many of these quickly.
+
+Commands:
+    uci | isready | ucinewgame | quit
+    setoption name Hash value <megabytes>
+    position startpos|fen <rows> <b|w> [moves <move> ...]
+    go [depth <n>] [movetime <ms>] [infinite]
+    stop
+    d                      (print the current position)
+
+Replies are 'info depth .. score .. nodes .. nps .. time .. pv ..' lines after
+every completed iteration, then 'bestmove <move>'; after 'go infinite' only
+once 'stop' arrives. A new position, go or ucinewgame ends the running
+search first. Moves use the game's notation, e.g. d4-d5 or c3xe5; the
+position command also accepts d4d5.
+"""
+import sys
+import threading
+import time
+
+from bitboard import from_board, from_fen, generate_moves, make_move, move_from_notation, move_to_notation, to_fen
+from brain import MAX_DEPTH, get_default_tablebase, iterative_deepening
+from transposition import TranspositionTable
+from utils import START_POSITION
+
+ENGINE_NAME = "Fianco"
+START_FEN = to_fen(from_board(START_POSITION), 2)  # White moves first
+
+
+class Engine:
+    """Protocol state: the current position, the table and the running search."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.hash_mb = 16
+        self.tt = None  # Allocated on first use, so starting the engine stays cheap
+        self.position, self.player = from_fen(START_FEN)
+        self.search_thread = None
+        self.stop = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        """
+        Runs one command line.
+        :return: False when the engine should exit, otherwise True
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("option name Hash type spin default 16 min 1 max 4096")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            if self.tt is not None:
+                self.tt.clear()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.go(args)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "d":
+            self.send(to_fen(self.position, self.player))
+        elif command == "quit":
+            self.stop_search()
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> value <value>
+        if "name" not in args or "value" not in args:
+            self.send("info string expected 'setoption name <name> value <value>'")
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        value = " ".join(args[args.index("value") + 1:])
+        if name == "hash":
+            try:
+                self.hash_mb = max(1, int(value))
+            except ValueError:
+                self.send(f"info string invalid Hash value {value}")
+                return
+            self.stop_search()
+            self.tt = None
+        else:
+            self.send(f"info string unknown option {name}")
+
+    def set_position(self, args):
+        if "moves" in args:
+            moves = args[args.index("moves") + 1:]
+            args = args[:args.index("moves")]
+        else:
+            moves = []
+        try:
+            if args and args[0] == "startpos":
+                position, player = from_fen(START_FEN)
+            elif args and args[0] == "fen":
+                position, player = from_fen(" ".join(args[1:]))
+            else:
+                raise ValueError("expected 'position startpos' or 'position fen <rows> <b|w>'")
+            for text in moves:
+                move = move_from_notation(text)
+                if move not in generate_moves(position, player):
+                    raise ValueError(f"illegal move {text}")
+                position, player = make_move(position, move), 3 - player
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        self.position, self.player = position, player
+
+    def go(self, args):
+        depth, time_limit_ms = None, None
+        try:
+            if "depth" in args:
+                depth = int(args[args.index("depth") + 1])
+            if "movetime" in args:
+                time_limit_ms = int(args[args.index("movetime") + 1])
+        except (ValueError, IndexError):
+            self.send("info string expected 'go [depth <n>] [movetime <ms>] [infinite]'")
+            return
+        if depth is None:
+            # Without a depth the search runs until movetime, or until 'stop' for 'go infinite'
+            depth = MAX_DEPTH if time_limit_ms is None or "infinite" in args else None
+        if self.tt is None:
+            self.tt = TranspositionTable(self.hash_mb)
+        self.stop.clear()
+        self.search_thread = threading.Thread(target=self.search,
+                                              args=(self.position, self.player, depth, time_limit_ms,
+                                                    "infinite" in args),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def search(self, position, player, depth, time_limit_ms, infinite=False):
+        start = time.perf_counter()
+
+        def report(current_depth, score, move, pv, nodes):
+            elapsed = time.perf_counter() - start
+            self.send(f"info depth {current_depth} score {score} nodes {nodes} nps {int(nodes / max(elapsed, 1e-6))} "
+                      f"time {int(elapsed * 1000)} pv {' '.join(move_to_notation(m) for m in pv)}")
+            if depth is not None and time_limit_ms is not None and current_depth >= depth:
+                self.stop.set()  # Both a depth and a movetime were given, whichever comes first ends the search
+
+        best_move = iterative_deepening(position, player, depth or MAX_DEPTH, time_limit_ms, self.tt, self.stop, report,
+                                        tablebase=get_default_tablebase())[0]
+        if infinite:
+            self.stop.wait()  # 'go infinite' answers only after 'stop', even when the search ended early
+        self.send(f"bestmove {move_to_notation(best_move) if best_move else '(none)'}")
+
+    def stop_search(self):
+        """Ends the running search, which sends its bestmove, and waits for it."""
+        self.stop.set()
+        self.wait_for_search()
+
+    def wait_for_search(self):
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main(stdin=sys.stdin, stdout=sys.stdout):
+    engine = Engine(stdout)
+    for line in stdin:
+        if not engine.handle(line):
+            break
+    engine.stop_search()
+
+
+if __name__ == "__main__":
+    main()
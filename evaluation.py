@@ -0,0 +1,160 @@
+"""
+Vectorized evaluation with NumPy. Positions are unpacked into (N, 9, 9)
+boolean planes and scored in one call, so scoring all children of a node costs
+a handful of array operations instead of a Python loop per square.
+
+Besides the piece-square values it scores:
+    runners     pieces with no opponent piece in the cone in front of them, worth
+                more the closer they are to the back row
+    blocked     pieces whose forward square is occupied
+    threatened  pieces the opponent could jump right now
+
+NumPy is only needed by this module; the search imports nothing from it and
+takes an Evaluator when one is passed in.
+"""
+import numpy as np
+
+from bitboard import ADVANCEMENT_SQUARE, COLS, ROWS, SQUARES, make_move
+
+RUNNER_BONUS = 20  # A runner on its starting row; one point more per row it has advanced
+BLOCKED_PENALTY = 1
+THREATENED_PENALTY = 4
+
+_BYTES = (SQUARES + 7) // 8
+
+
+def _cone_masks():
+    """
+    cone[player][sq, other] is True when a piece of the opponent on other can
+    still reach the path of player's piece on sq: any square ahead of it whose
+    column is at most as many columns away as it is rows ahead.
+    """
+    cone = np.zeros((3, SQUARES, SQUARES), dtype=np.float32)
+    for sq in range(SQUARES):
+        row, col = divmod(sq, COLS)
+        for other in range(SQUARES):
+            other_row, other_col = divmod(other, COLS)
+            if abs(other_col - col) <= other_row - row:
+                cone[1, sq, other] = 1  # Black runs downwards
+            if abs(other_col - col) <= row - other_row:
+                cone[2, sq, other] = 1  # White runs upwards
+    return cone
+
+
+_CONE_T = _cone_masks().transpose(0, 2, 1)  # Transposed, so that pieces @ _CONE_T[player] counts the cone
+_ROW = np.arange(SQUARES) // COLS
+_LEFT_OF_COL_7 = (np.arange(SQUARES) % COLS < COLS - 2).astype(np.float32)  # Squares that can jump two columns right
+_RIGHT_OF_COL_1 = (np.arange(SQUARES) % COLS >= 2).astype(np.float32)  # Squares that can jump two columns left
+
+
+def positions_to_planes(positions):
+    """
+    Unpacks bitboard positions into boolean planes.
+    :param positions: Sequence of (black, white) tuples
+    :return: (black, white) arrays of shape (N, 9, 9)
+    """
+    count = len(positions)
+    data = b"".join(black.to_bytes(_BYTES, "little") + white.to_bytes(_BYTES, "little") for black, white in positions)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8).reshape(count, 2, _BYTES), axis=2, bitorder="little")
+    planes = bits[:, :, :SQUARES].astype(bool).reshape(count, 2, ROWS, COLS)
+    return planes[:, 0], planes[:, 1]
+
+
+def boards_to_planes(boards):
+    """
+    Converts list-of-lists boards (0 empty, 1 black, 2 white) into boolean planes.
+    :param boards: A (N, 9, 9) array or nested list
+    :return: (black, white) arrays of shape (N, 9, 9)
+    """
+    boards = np.asarray(boards)
+    return boards == 1, boards == 2
+
+
+class Evaluator:
+    """
+    Scores batches of positions from White's point of view, like
+    bitboard.evaluate. The weights can be changed per instance to try out
+    variants in self-play.
+    """
+
+    def __init__(self, piece_square=ADVANCEMENT_SQUARE, runner=RUNNER_BONUS, blocked=BLOCKED_PENALTY,
+                 threatened=THREATENED_PENALTY):
+        """
+        :param piece_square: Piece-square table in the bitboard.EVALUATIONS layout
+        :param runner: Bonus for a runner on its starting row, plus one per row advanced
+        :param blocked: Penalty for a piece with an occupied square in front
+        :param threatened: Penalty per opponent jump available against a piece
+        """
+        self.black_values = np.array(piece_square[1], dtype=np.float32)
+        self.white_values = np.array(piece_square[2], dtype=np.float32)
+        # Indexed by square: the runner bonus plus the rows advanced, or zeros to switch the term off
+        self.black_runner = (runner + _ROW if runner else 0 * _ROW).astype(np.float32)
+        self.white_runner = (runner + (ROWS - 1 - _ROW) if runner else 0 * _ROW).astype(np.float32)
+        self.blocked = blocked
+        self.threatened = threatened
+        # Most one capture can change the score by: the captured piece's value, its runner bonus
+        # and the penalties it took part in. Quiescence uses this for delta pruning.
+        self.margin = int(max(np.abs(self.black_values).max(), np.abs(self.white_values).max())
+                          + self.black_runner.max() + 2 * blocked + 4 * threatened)
+
+    def evaluate_planes(self, black, white):
+        """
+        Scores positions given as boolean planes.
+        :param black: (N, 9, 9) bool array of black pieces
+        :param white: (N, 9, 9) bool array of white pieces
+        :return: int64 array of N scores, higher is better for White
+        """
+        # Every term works on (N, 81) rows, where moving a row down adds 9 to the square index
+        count = black.shape[0]
+        black = black.reshape(count, SQUARES).astype(np.float32)
+        white = white.reshape(count, SQUARES).astype(np.float32)
+        score = black @ self.black_values + white @ self.white_values
+
+        # Runners: no opponent piece anywhere in the cone ahead
+        score += ((white * ((black @ _CONE_T[2]) == 0)) @ self.white_runner
+                  - (black * ((white @ _CONE_T[1]) == 0)) @ self.black_runner)
+
+        occupied = black + white
+        if self.blocked:
+            # White steps up to sq - 9, Black steps down to sq + 9
+            score -= self.blocked * ((white[:, 9:] * occupied[:, :-9]).sum(axis=1)
+                                     - (black[:, :-9] * occupied[:, 9:]).sum(axis=1))
+        if self.threatened:
+            empty = 1 - occupied
+            # Black on sq jumps over sq + 10 to sq + 20 (two columns right) or over sq + 8 to
+            # sq + 16 (two columns left); White jumps upwards. The masks drop jumps off the board edge.
+            white_threatened = ((black[:, :-20] * white[:, 10:-10] * empty[:, 20:]) @ _LEFT_OF_COL_7[:-20]
+                                + (black[:, :-16] * white[:, 8:-8] * empty[:, 16:]) @ _RIGHT_OF_COL_1[:-16])
+            black_threatened = ((white[:, 20:] * black[:, 10:-10] * empty[:, :-20]) @ _RIGHT_OF_COL_1[20:]
+                                + (white[:, 16:] * black[:, 8:-8] * empty[:, :-16]) @ _LEFT_OF_COL_7[16:])
+            score -= self.threatened * (white_threatened - black_threatened)
+        return score.astype(np.int64)
+
+    def evaluate_batch(self, positions):
+        """
+        :param positions: Sequence of (black, white) bitboard tuples
+        :return: int64 array of scores, higher is better for White
+        """
+        return self.evaluate_planes(*positions_to_planes(positions))
+
+    def evaluate_boards(self, boards):
+        """
+        :param boards: (N, 9, 9) list-of-lists boards as used by game.py
+        :return: int64 array of scores, higher is better for White
+        """
+        return self.evaluate_planes(*boards_to_planes(boards))
+
+    def evaluate(self, position):
+        """Scores a single (black, white) position, higher is better for White."""
+        return int(self.evaluate_batch([position])[0])
+
+    def score_children(self, position, moves):
+        """
+        Scores the position after each move in one batch.
+        :param position: The position as a (black, white) tuple
+        :param moves: The (from_sq, to_sq) moves to score
+        :return: A list of scores, higher is better for White
+        """
+        if not moves:
+            return []
+        return self.evaluate_batch([make_move(position, move) for move in moves]).tolist()
@@ -1,17 +1,19 @@
+import os
 import pygame
 import sys
-from brain import ai_move
-from utils import make_move_for_ai, get_all_valid_moves, is_terminal, is_valid_move, available_captures  # Import shared functions from utils.py
+from async_engine import AsyncEngine
+from bitboard import from_board, move_from_coords, move_to_coords, to_board, winner, make_move as bitboard_make_move
+from gamerecord import UNFINISHED, ArchiveWriter, GameArchive
+from utils import START_POSITION, make_move_for_ai, get_all_valid_moves, is_terminal, is_valid_move, available_captures  # Import shared functions from utils.py
 
 
-# Initialize Pygame
-pygame.init()
-
 # Screen dimensions
 WIDTH, HEIGHT = 500, 500
 WINDOW_WIDTH = WIDTH+200
 ROWS, COLS = 9, 9
 SQUARE_SIZE = WIDTH // COLS
+AI_TIME_LIMIT_MS = 1000  # Thinking time per AI move
+RECORD_PATH = 'game.fgr'  # Written with S and read back with L, see gamerecord.py
 
 # Colors
 WHITE = (255, 255, 255)
@@ -19,26 +21,24 @@ BLACK = (0, 0, 0)
 GREY = (169, 169, 169)
 BROWN = (139, 69, 19)
 
-# Load assets
-WHITE_PIECE = pygame.transform.scale(pygame.image.load('white_piece.png'), (SQUARE_SIZE, SQUARE_SIZE))
-BLACK_PIECE = pygame.transform.scale(pygame.image.load('black_piece.png'), (SQUARE_SIZE, SQUARE_SIZE))
-
-# Initialize screen
-screen = pygame.display.set_mode((WINDOW_WIDTH, HEIGHT))
-pygame.display.set_caption('Fianco')
-
-# Board setup from the given image
-START_POSITION = [
-    [1, 1, 1, 1, 1, 1, 1, 1, 1],
-    [0, 1, 0, 0, 0, 0, 0, 1, 0],
-    [0, 0, 1, 0, 0, 0, 1, 0, 0],
-    [0, 0, 0, 1, 0, 1, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 2, 0, 2, 0, 0, 0],
-    [0, 0, 2, 0, 0, 0, 2, 0, 0],
-    [0, 2, 0, 0, 0, 0, 0, 2, 0],
-    [2, 2, 2, 2, 2, 2, 2, 2, 2]
-]
+# Window and assets, set up by init_display() so importing this module doesn't open a window
+screen = None
+WHITE_PIECE = BLACK_PIECE = None
+
+
+def init_display():
+    global screen, WHITE_PIECE, BLACK_PIECE
+
+    # Initialize Pygame
+    pygame.init()
+
+    # Load assets
+    WHITE_PIECE = pygame.transform.scale(pygame.image.load('white_piece.png'), (SQUARE_SIZE, SQUARE_SIZE))
+    BLACK_PIECE = pygame.transform.scale(pygame.image.load('black_piece.png'), (SQUARE_SIZE, SQUARE_SIZE))
+
+    # Initialize screen
+    screen = pygame.display.set_mode((WINDOW_WIDTH, HEIGHT))
+    pygame.display.set_caption('Fianco')
 
 # Draw the board
 def draw_board():
@@ -172,12 +172,43 @@ def redo_move(board, move_history, current_move_index):
 
 
 
+# Save the whole move history, including moves that were taken back, as a game record
+def save_game(move_history, path=RECORD_PATH):
+    moves = [move_from_coords((start, end)) for start, end, _ in move_history]
+    position = from_board(START_POSITION)
+    for move in moves:
+        position = bitboard_make_move(position, move)
+    with ArchiveWriter(path) as writer:
+        writer.add_game(moves, result=winner(position) or UNFINISHED)
+
+
+
+# Load the game saved by save_game and set up its final position straight from the record
+def load_game(path=RECORD_PATH):
+    with GameArchive(path) as archive:
+        record = archive[-1]
+        moves = record.moves()
+        position, current_player = record.position(len(record))
+    move_history, annotations = [], []
+    for move in moves:
+        start, end = move_to_coords(move)
+        is_capture = abs(start[0] - end[0]) == 2
+        move_history.append((start, end, is_capture))
+        annotations.append(index_to_notation(start, end, is_capture))
+    return to_board(position), current_player, move_history, annotations, len(move_history) - 1
+
+
+
 # Main game loop
 def main():
+    init_display()
     clock = pygame.time.Clock()
-    
+    engine = AsyncEngine()  # Searches in the background; results are kept between the AI's moves within a game
+    ai_search = None  # Handle of the AI search in progress
+
     def reset_game():
         # Reset the game state
+        engine.new_game()
         board = [row[:] for row in START_POSITION]  # Reset the board to the starting position
         selected_piece = None
         current_player = 2  # White starts (AI)
@@ -220,18 +251,24 @@ def main():
             piece_image = WHITE_PIECE if current_player == 2 else BLACK_PIECE
             screen.blit(piece_image, (dragged_pos[0] - piece_drag_offset[0], dragged_pos[1] - piece_drag_offset[1]))
 
-        # AI makes a move if it's White's turn
+        # AI makes a move if it's White's turn. The search runs in the background so
+        # the window keeps redrawing and handling input while the AI thinks.
         if current_player == 2:  # White is the AI
-            best_move = ai_move(board, current_player, depth=3, rows=ROWS, cols=COLS)  # Call AI move with depth limit
-            if best_move:
-                move_history, annotations, current_move_index = make_move(
-                    board, best_move[0], best_move[1], move_history, annotations, current_move_index, current_player
-                )
-                current_player = 3 - current_player  # Switch turns to Black (Human)
+            if ai_search is None:
+                ai_search = engine.request_move(board, current_player, time_limit_ms=AI_TIME_LIMIT_MS)
+            elif ai_search.done():
+                best_move = ai_search.result()
+                ai_search = None
+                if best_move:
+                    move_history, annotations, current_move_index = make_move(
+                        board, best_move[0], best_move[1], move_history, annotations, current_move_index, current_player
+                    )
+                    current_player = 3 - current_player  # Switch turns to Black (Human)
 
         # Human (Black) can make moves manually
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                engine.shutdown()
                 pygame.quit()  # Quit the game only if the user closes the window
                 sys.exit()
 
@@ -239,6 +276,7 @@ def main():
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if restart_button_rect.collidepoint(event.pos):  # Check if restart button was clicked
                     board, selected_piece, current_player, dragging_piece, piece_drag_offset, dragged_pos, move_history, annotations, current_move_index = reset_game()
+                    ai_search = None  # reset_game cancelled it
 
             # Handle mouse button down for piece selection and movement (only for Human's turn)
             if current_player == 1:  # Black (Human) plays
@@ -290,6 +328,9 @@ def main():
 
             # Navigate move history with arrow keys
             if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_LEFT, pygame.K_RIGHT) and ai_search is not None:
+                    ai_search.cancel()  # The position the AI was thinking about is going away
+                    ai_search = None
                 if event.key == pygame.K_LEFT:  # Go back one move
                     if current_move_index >= 0:
                         board, current_move_index = undo_move(board, move_history, current_move_index)
@@ -298,6 +339,13 @@ def main():
                     if current_move_index < len(move_history) - 1:
                         board, current_move_index = redo_move(board, move_history, current_move_index)
                         current_player = 3 - current_player  # Switch turns after redo
+                elif event.key == pygame.K_s:  # Save the game
+                    save_game(move_history)
+                elif event.key == pygame.K_l and os.path.exists(RECORD_PATH):  # Load the saved game
+                    engine.new_game()  # Also cancels the AI search
+                    ai_search = None
+                    selected_piece, dragging_piece, dragged_pos = None, False, None
+                    board, current_player, move_history, annotations, current_move_index = load_game()
 
         pygame.display.flip()
         clock.tick(60)
@@ -0,0 +1,249 @@
+"""
+Game records: an archive file of games stored as two bytes per move, with
+a snapshot of the position every few plies so that any ply of any game can
+be set up without replaying the game from its first move.
+
+    with ArchiveWriter("games.fgr") as writer:
+        writer.add_game(moves, result=2)
+    archive = GameArchive("games.fgr")    # memory-mapped, cheap to open
+    position, player = archive[0].position(57)
+
+    python gamerecord.py --selfplay results.jsonl --out games.fgr   # from selfplay.py results
+    python gamerecord.py --show games.fgr --game 3 --ply 40
+
+File: a HEADER (MAGIC, VERSION, snapshot interval, game count, index
+offset), then the games, then the index: one uint64 file offset per game.
+A game is a GAME header (plies, player to move first, result), its start
+position as a SNAPSHOT, the moves as (from_sq, to_sq) byte pairs, and a
+SNAPSHOT of the position after every snapshot-interval plies.
+"""
+import argparse
+import json
+import mmap
+import struct
+from array import array
+
+from bitboard import SQUARES, from_board, make_move, move_from_notation, move_to_notation, to_fen
+from utils import START_POSITION
+
+MAGIC = b"FNGR"
+VERSION = 1
+HEADER = struct.Struct("<4sBxHQQ")  # Magic, version, snapshot interval, game count, index offset
+GAME = struct.Struct("<IBB2x")  # Plies, player to move first, result
+SNAPSHOT = struct.Struct("<11s11s")  # Black and white bitboards, little-endian
+SNAPSHOT_INTERVAL = 16  # Plies between snapshots; a seek replays fewer moves than this
+
+UNFINISHED = 0  # Results; 1 and 2 are the winning player
+DRAW = 3
+
+
+def _pack_position(position):
+    black, white = position
+    return SNAPSHOT.pack(black.to_bytes(11, "little"), white.to_bytes(11, "little"))
+
+
+def _unpack_position(data, offset):
+    black, white = SNAPSHOT.unpack_from(data, offset)
+    return int.from_bytes(black, "little"), int.from_bytes(white, "little")
+
+
+class ArchiveWriter:
+    """Writes games to an archive file one at a time."""
+
+    def __init__(self, path, snapshot_interval=SNAPSHOT_INTERVAL):
+        if not 0 < snapshot_interval <= 0xFFFF:
+            raise ValueError(f"snapshot_interval must be between 1 and 65535, not {snapshot_interval}")
+        self.snapshot_interval = snapshot_interval
+        self.offsets = array('Q')
+        self.handle = open(path, "wb")
+        self.handle.write(HEADER.pack(MAGIC, VERSION, snapshot_interval, 0, 0))  # Completed by close()
+
+    def add_game(self, moves, position=None, player=2, result=UNFINISHED):
+        """
+        Appends a game.
+        :param moves: The game's (from_sq, to_sq) moves
+        :param position: The (black, white) position the game starts from, the start position by default
+        :param player: The player to move first (1 for black, 2 for white)
+        :param result: UNFINISHED, DRAW, or the winning player
+        :return: The index of the game in the archive
+        """
+        if position is None:
+            position = from_board(START_POSITION)
+        data = bytearray(GAME.pack(len(moves), player, result))
+        data += _pack_position(position)
+        snapshots = bytearray()
+        for ply, (frm, to) in enumerate(moves, 1):
+            if not (0 <= frm < SQUARES and 0 <= to < SQUARES):
+                raise ValueError(f"Invalid move {(frm, to)} at ply {ply}")
+            data.append(frm)
+            data.append(to)
+            position = make_move(position, (frm, to))
+            if ply % self.snapshot_interval == 0:
+                snapshots += _pack_position(position)
+        self.offsets.append(self.handle.tell())
+        self.handle.write(data)
+        self.handle.write(snapshots)
+        return len(self.offsets) - 1
+
+    def close(self):
+        """Writes the index and the header; the file can't be read before this."""
+        index_offset = self.handle.tell()
+        self.handle.write(self.offsets.tobytes())
+        self.handle.seek(0)
+        self.handle.write(HEADER.pack(MAGIC, VERSION, self.snapshot_interval, len(self.offsets), index_offset))
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameRecord:
+    """One game of an archive, read in place from the archive's memory map."""
+
+    __slots__ = ('data', 'offset', 'interval', 'plies', 'player', 'result')
+
+    def __init__(self, data, offset, interval):
+        self.data = data
+        self.offset = offset
+        self.interval = interval
+        self.plies, self.player, self.result = GAME.unpack_from(data, offset)
+
+    def __len__(self):
+        return self.plies
+
+    @property
+    def winner(self):
+        """1 or 2 for the player who won, None for a draw or an unfinished game."""
+        return self.result if self.result in (1, 2) else None
+
+    def _moves_offset(self):
+        return self.offset + GAME.size + SNAPSHOT.size
+
+    def move(self, ply):
+        """The (from_sq, to_sq) move played at ply, counted from 0."""
+        if not 0 <= ply < self.plies:
+            raise IndexError(f"ply {ply} out of range for a game of {self.plies} plies")
+        offset = self._moves_offset() + 2 * ply
+        return self.data[offset], self.data[offset + 1]
+
+    def moves(self):
+        """Every move of the game as a list of (from_sq, to_sq)."""
+        raw = self.data[self._moves_offset():self._moves_offset() + 2 * self.plies]
+        return list(zip(raw[::2], raw[1::2]))
+
+    def position(self, ply):
+        """
+        Sets up the position after ply moves: the closest snapshot at or
+        before ply, then fewer than the snapshot interval moves replayed.
+        :param ply: 0 for the start position, up to len(self) for the final one
+        :return: (position, player to move)
+        """
+        if not 0 <= ply <= self.plies:
+            raise IndexError(f"ply {ply} out of range for a game of {self.plies} plies")
+        snapshot = ply // self.interval
+        if snapshot:
+            offset = self._moves_offset() + 2 * self.plies + (snapshot - 1) * SNAPSHOT.size
+        else:
+            offset = self.offset + GAME.size
+        position = _unpack_position(self.data, offset)
+        data = self.data
+        for offset in range(self._moves_offset() + 2 * snapshot * self.interval, self._moves_offset() + 2 * ply, 2):
+            position = make_move(position, (data[offset], data[offset + 1]))
+        return position, self.player if ply % 2 == 0 else 3 - self.player
+
+    def positions(self):
+        """Yields (position, player, move) for every move of the game, in order, replaying once."""
+        position, player = self.position(0)
+        for move in self.moves():
+            yield position, player, move
+            position, player = make_move(position, move), 3 - player
+
+
+class GameArchive:
+    """Reads an archive file through mmap; archive[i] is the i-th game as a GameRecord."""
+
+    def __init__(self, path):
+        self.handle = open(path, "rb")
+        self.data = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.snapshot_interval, self.count, index_offset = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} game archive")
+        if not index_offset:
+            raise ValueError(f"{path} was not closed by its writer")
+        self.index = memoryview(self.data)[index_offset:index_offset + 8 * self.count].cast('Q')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, game):
+        if game < 0:
+            game += self.count
+        if not 0 <= game < self.count:
+            raise IndexError(f"game {game} out of range for an archive of {self.count} games")
+        return GameRecord(self.data, self.index[game], self.snapshot_interval)
+
+    def __iter__(self):
+        for game in range(self.count):
+            yield self[game]
+
+    def close(self):
+        self.index.release()
+        self.data.close()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_selfplay(writer, path):
+    """
+    Adds the games of a selfplay.py JSONL file.
+    :return: The number of games read
+    """
+    games = 0
+    with open(path) as handle:
+        for line in handle:
+            record = json.loads(line)
+            a_player = 2 if record['a_color'] == 'white' else 1
+            if record['result'] == 'draw':
+                result = DRAW
+            else:
+                result = a_player if record['result'] == 'a' else 3 - a_player
+            writer.add_game([move_from_notation(text) for text in record['moves']], result=result)
+            games += 1
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a game archive.")
+    parser.add_argument("--selfplay", nargs="*", default=[], help="selfplay.py JSONL files to convert")
+    parser.add_argument("--out", default=None, help="Archive file to write")
+    parser.add_argument("--show", default=None, help="Archive file to inspect")
+    parser.add_argument("--game", type=int, default=0, help="Game to show")
+    parser.add_argument("--ply", type=int, default=None, help="Ply to show, the final position by default")
+    args = parser.parse_args()
+
+    if args.show:
+        with GameArchive(args.show) as archive:
+            record = archive[args.game]
+            ply = len(record) if args.ply is None else args.ply
+            print(f"{len(archive)} games; game {args.game}: {len(record)} plies, result {record.result}")
+            print(' '.join(move_to_notation(move) for move in record.moves()[:ply]))
+            print(to_fen(*record.position(ply)))
+        return
+
+    if not args.out or not args.selfplay:
+        parser.error("give --selfplay files and --out, or --show")
+    with ArchiveWriter(args.out) as writer:
+        for path in args.selfplay:
+            print(f"{path}: {load_selfplay(writer, path)} games")
+
+
+if __name__ == "__main__":
+    main()
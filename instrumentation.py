@@ -0,0 +1,205 @@
+"""
+Search instrumentation: the statistics of one search, and profilers that can
+be switched on around it.
+
+    move, stats = ai_move(board, 2, depth=5, return_stats=True, profile='sample')
+    print(stats)                  # one line for the logs
+    json.dumps(stats.as_dict())   # structured record
+    print(stats.profile)          # where the time went
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+from collections import Counter
+
+from bitboard import move_to_notation
+
+PROFILE_MODES = (None, 'cprofile', 'sample')
+SAMPLE_INTERVAL = 0.001  # Seconds between samples of the sampling profiler
+PROFILE_LINES = 20  # Functions listed in a profile report
+
+
+class SearchStats:
+    """What one search did: its result, counters and timing."""
+
+    def __init__(self, source='search'):
+        """
+        :param source: 'search', 'book' or 'tablebase', whichever produced the move
+        """
+        self.source = source
+        self.best_move = None
+        self.score = None
+        self.pv = []
+        self.depth = 0  # Depth of the last completed iteration
+        self.nodes = 0  # All nodes, including qnodes
+        self.qnodes = 0
+        self.cutoffs = 0  # Beta cutoffs
+        self.first_move_cutoffs = 0  # Beta cutoffs caused by the first move searched
+        self.tt_probes = 0
+        self.tt_hits = 0  # Probes that found an entry
+        self.tt_cutoffs = 0  # Probes whose entry answered the node
+        self.tb_hits = 0
+        self.delta_pruned = 0
+        self.researches = 0  # Null-window searches repeated with the full window
+        self.aspiration_researches = 0  # Root searches repeated after falling outside the aspiration window
+        self.reductions = 0  # Moves searched with a late move reduction
+        self.reduction_researches = 0  # Reduced moves searched again to full depth
+        self.futility_pruned = 0
+        self.null_cutoffs = 0  # Nodes cut by a null move
+        self.elapsed = 0.0  # Seconds
+        self.iterations = []  # (depth, score, nodes, seconds) after every completed iteration
+        self.profile = None  # Profile report text when profiling was switched on
+
+    @classmethod
+    def from_state(cls, state, best_move, score, pv, depth, elapsed):
+        """Collects the counters of a brain.SearchState after a search."""
+        stats = cls('tablebase' if state.tb_hits and not state.nodes else 'search')
+        stats.best_move, stats.score, stats.pv, stats.depth, stats.elapsed = best_move, score, pv, depth, elapsed
+        stats.nodes, stats.qnodes = state.nodes, state.qnodes
+        stats.cutoffs, stats.first_move_cutoffs = state.orderer.cutoffs, state.orderer.first_move_cutoffs
+        stats.tt_probes, stats.tt_hits, stats.tt_cutoffs = state.tt_probes, state.tt_hits, state.tt_cutoffs
+        stats.tb_hits, stats.delta_pruned = state.tb_hits, state.delta_pruned
+        stats.researches, stats.aspiration_researches = state.researches, state.aspiration_researches
+        stats.reductions, stats.reduction_researches = state.reductions, state.reduction_researches
+        stats.futility_pruned, stats.null_cutoffs = state.futility_pruned, state.null_cutoffs
+        return stats
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def branching_factor(self):
+        """Effective branching factor: nodes of the last iteration over nodes of the one before."""
+        if len(self.iterations) < 2:
+            return None
+        nodes = [0] + [iteration[2] for iteration in self.iterations]
+        last, previous = nodes[-1] - nodes[-2], nodes[-2] - nodes[-3]
+        return last / previous if previous else None
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        """The stats as a JSON-friendly dict, with moves in game notation."""
+        return {
+            'source': self.source,
+            'move': move_to_notation(self.best_move) if self.best_move else None,
+            'score': self.score,
+            'pv': [move_to_notation(move) for move in self.pv],
+            'depth': self.depth,
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': round(self.first_move_cutoff_rate, 4),
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_cutoffs': self.tt_cutoffs,
+            'tb_hits': self.tb_hits,
+            'delta_pruned': self.delta_pruned,
+            'researches': self.researches,
+            'aspiration_researches': self.aspiration_researches,
+            'reductions': self.reductions,
+            'reduction_researches': self.reduction_researches,
+            'futility_pruned': self.futility_pruned,
+            'null_cutoffs': self.null_cutoffs,
+            'elapsed_ms': round(self.elapsed * 1000, 3),
+            'nps': round(self.nps),
+            'branching_factor': round(self.branching_factor, 3) if self.branching_factor else None,
+            'iterations': [{'depth': depth, 'score': score, 'nodes': nodes, 'elapsed_ms': round(seconds * 1000, 3)}
+                           for depth, score, nodes, seconds in self.iterations],
+        }
+
+    def __str__(self):
+        move = move_to_notation(self.best_move) if self.best_move else '(none)'
+        if self.source != 'search':
+            return f"{move} from {self.source}"
+        branching = f"{self.branching_factor:.2f}" if self.branching_factor else "-"
+        return (f"{move} score {self.score} depth {self.depth} nodes {self.nodes} (q {self.qnodes}) "
+                f"nps {self.nps:.0f} time {self.elapsed * 1000:.1f}ms ebf {branching} "
+                f"cutoffs {self.cutoffs} ({self.first_move_cutoff_rate:.1%} first) "
+                f"tt {self.tt_hits}/{self.tt_probes} tb {self.tb_hits} "
+                f"pv {' '.join(move_to_notation(m) for m in self.pv)}")
+
+
+class SamplingProfiler:
+    """
+    Records which function a thread is running every SAMPLE_INTERVAL seconds.
+    Far cheaper than cProfile, so it can stay on in production.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()  # (file, line, function) of the innermost frame -> count
+        self.callers = Counter()  # Every function on the stack, counted once per sample
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='fianco-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            code = frame.f_code
+            self.samples[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                if code not in seen:
+                    seen.add(code)
+                    self.callers[(code.co_filename, code.co_firstlineno, code.co_name)] += 1
+                frame = frame.f_back
+
+    def report(self, lines=PROFILE_LINES):
+        total = sum(self.samples.values())
+        if not total:
+            return "no samples"
+        out = [f"{total} samples, {self.interval * 1000:g}ms apart", "self%  total%  function"]
+        self_time = Counter()
+        for (filename, _, name), count in self.samples.items():
+            self_time[(filename, name)] += count
+        for (filename, line, name), count in self.callers.most_common(lines):
+            out.append(f"{self_time[(filename, name)] / total:5.1%} {count / total:6.1%}  "
+                       f"{name} ({filename.rsplit('/', 1)[-1]}:{line})")
+        return "\n".join(out)
+
+
+def run_profiled(function, mode):
+    """
+    Calls function() with a profiler running.
+    :param mode: None, 'cprofile' (every call, slow) or 'sample' (SamplingProfiler)
+    :return: (result, report text or None)
+    """
+    if mode is None:
+        return function(), None
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        result = profiler.runcall(function)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('tottime').print_stats(PROFILE_LINES)
+        return result, text.getvalue()
+    if mode == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            result = function()
+        finally:
+            profiler.stop()
+        return result, profiler.report()
+    raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
@@ -0,0 +1,65 @@
+from bitboard import SQUARES, BLACK_GOAL, WHITE_GOAL
+
+MAX_PLY = 128  # Deepest ply that keeps killer moves
+GOAL_BONUS = 1 << 30  # Sorts moves that reach the back row (and win) before everything else
+FIRST_BONUS = 1 << 31  # Sorts the TT/PV move before everything else
+KILLER_BONUS = 1 << 28  # Sorts killer moves before moves that only have a history score
+
+
+class MoveOrderer:
+    """
+    Orders moves between move generation and search: the TT/PV move first,
+    then winning moves, then killer moves for the ply, then the rest by
+    history score. Captures are compulsory, so a node's moves are either all
+    captures or all quiet moves and captures never compete with quiet moves.
+    """
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * SQUARES for _ in range(SQUARES)]  # Indexed [from_sq][to_sq]
+        self.cutoffs = 0  # Beta cutoffs seen
+        self.first_move_cutoffs = 0  # Beta cutoffs caused by the first move searched
+
+    def order(self, moves, ply, player, first_move=None):
+        """
+        Sorts moves in place, best candidates first.
+        :param moves: The list of (from_sq, to_sq) moves to sort
+        :param ply: Distance from the root, used to look up killer moves
+        :param player: The player to move (1 for black, 2 for white)
+        :param first_move: The TT or PV move, searched before anything else
+        :return: The sorted list
+        """
+        history = self.history
+        goal = BLACK_GOAL if player == 1 else WHITE_GOAL
+        killer_1, killer_2 = self.killers[ply] if ply < MAX_PLY else (None, None)
+
+        def score(move):
+            if move == first_move:
+                return FIRST_BONUS
+            if (1 << move[1]) & goal:
+                return GOAL_BONUS
+            if move == killer_1 or move == killer_2:
+                return KILLER_BONUS + (move == killer_1)
+            return history[move[0]][move[1]]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def record_cutoff(self, move, ply, depth, move_index, capture=False):
+        """
+        Records the move that caused a beta cutoff.
+        :param move: The (from_sq, to_sq) move
+        :param ply: Distance from the root
+        :param depth: Remaining depth at the node, deeper cutoffs weigh more
+        :param move_index: Position of the move in the searched order
+        :param capture: Captures aren't stored as killers since they are always tried anyway
+        """
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        self.history[move[0]][move[1]] += depth * depth
+        if not capture and ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
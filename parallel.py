@@ -0,0 +1,206 @@
+import argparse
+import atexit
+import multiprocessing as mp
+import time
+from multiprocessing.sharedctypes import RawArray
+
+import brain
+from bitboard import from_board, generate_moves
+from searchboard import SearchBoard
+from transposition import TranspositionTable
+
+LAZY_SMP = 'lazy'  # Every worker searches the whole tree, sharing one transposition table
+ROOT_SPLIT = 'root'  # Root moves are dealt out to the workers, sharing the alpha bound
+
+NO_ALPHA = -(1 << 62)  # Shared alpha before any root move has been searched
+
+_worker = {}  # Per-process state set up by _init_worker
+_searchers = {}  # ParallelSearcher instances kept alive by ai_move, keyed by (workers, strategy)
+
+
+def _init_worker(shared_tt, tt_mb, shared_alpha, stop):
+    # Lazy SMP workers all map the same table, root-split workers each keep their own
+    _worker['tt'] = TranspositionTable(tt_mb, buffer=shared_tt) if shared_tt is not None else TranspositionTable(tt_mb)
+    _worker['alpha'] = shared_alpha
+    _worker['stop'] = stop
+
+
+def _deadline(wall_deadline):
+    # time.time() is comparable between processes, perf_counter() is what the search reads
+    if wall_deadline is None:
+        return None
+    return time.perf_counter() + (wall_deadline - time.time())
+
+
+def _lazy_smp_task(args):
+    position, player, depth, time_limit_ms, generation, index = args
+    tt = _worker['tt']
+    tt.generation = generation
+    # Half the helpers aim one ply deeper, so the workers don't all finish the same
+    # iterations at the same moment and the table gets results the others can reuse.
+    # Helpers are stopped as soon as the main worker (index 0) is done.
+    return brain.iterative_deepening(position, player, depth + (index & 1), time_limit_ms, tt,
+                                     _worker['stop'] if index else None)
+
+
+def _root_move_task(args):
+    position, player, move, depth, wall_deadline, generation = args
+    tt = _worker['tt']
+    tt.generation = generation
+    shared_alpha = _worker['alpha']
+    state = brain.SearchState(tt, _deadline(wall_deadline))
+    board = SearchBoard(position, player)
+    state.root_ply = len(board.stack)
+    board.do_move(move)
+    alpha = shared_alpha.value
+    pv = []
+    try:
+        score = -brain.negamax(board, depth - 1, float('-inf'), -alpha, state, pv)
+    except brain.SearchAborted:
+        return move, None, [], state.nodes
+    with shared_alpha.get_lock():
+        if score > shared_alpha.value:
+            shared_alpha.value = score  # Later root moves now only need to prove they beat this
+    return move, score, [move] + pv, state.nodes
+
+
+class ParallelSearcher:
+    """
+    Multi-process search. Threads don't help here because of the GIL, so the
+    workers are processes that live for as long as the searcher does, which
+    also keeps their transposition tables warm between moves.
+    """
+
+    def __init__(self, workers=4, strategy=LAZY_SMP, tt_mb=16):
+        """
+        :param workers: Number of worker processes
+        :param strategy: LAZY_SMP or ROOT_SPLIT
+        :param tt_mb: Transposition table budget, shared by all workers for LAZY_SMP and per worker for ROOT_SPLIT
+        """
+        if strategy not in (LAZY_SMP, ROOT_SPLIT):
+            raise ValueError(f"Unknown parallel strategy: {strategy}")
+        self.workers = workers
+        self.strategy = strategy
+        self.generation = 0
+        shared_tt = RawArray('Q', TranspositionTable.size_bytes(tt_mb) // 8) if strategy == LAZY_SMP else None
+        self.alpha = mp.Value('q', NO_ALPHA)
+        self.stop = mp.Event()
+        self.pool = mp.Pool(workers, _init_worker, (shared_tt, tt_mb, self.alpha, self.stop))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, position, player, depth=3, time_limit_ms=None):
+        """
+        Searches a position with all workers.
+        :param position: The position as a (black, white) tuple of bitboards
+        :param player: The player to move (1 for black, 2 for white)
+        :param depth: The final depth when there is no time limit
+        :param time_limit_ms: Optional time budget in milliseconds
+        :return: (best_move, score, pv, depth_reached, nodes) like brain.iterative_deepening
+        """
+        self.generation = (self.generation + 1) & 0xFF
+        if self.strategy == LAZY_SMP:
+            return self._search_lazy_smp(position, player, depth, time_limit_ms)
+        return self._search_root_split(position, player, depth, time_limit_ms)
+
+    def _search_lazy_smp(self, position, player, depth, time_limit_ms):
+        self.stop.clear()
+        pending = [self.pool.apply_async(_lazy_smp_task, ((position, player, depth, time_limit_ms, self.generation, index),))
+                   for index in range(self.workers)]
+        main_result = pending[0].get()
+        self.stop.set()
+        results = [main_result] + [result.get() for result in pending[1:]]
+        nodes = sum(result[4] for result in results)
+        # The deepest completed search wins, the main worker breaks ties
+        best = max(results, key=lambda result: result[3])
+        return best[0], best[1], best[2], best[3], nodes
+
+    def _search_root_split(self, position, player, depth, time_limit_ms):
+        wall_deadline = time.time() + time_limit_ms / 1000 if time_limit_ms is not None else None
+        moves = generate_moves(position, player)
+        if not moves:
+            return None, -brain.WIN_SCORE, [], 0, 0
+        best_move, best_score, best_pv, depth_reached, nodes = moves[0], None, [moves[0]], 0, 0
+        if time_limit_ms is not None and len(moves) == 1:
+            return best_move, None, best_pv, 0, 0
+
+        scores = {}
+        final_depth = brain.MAX_DEPTH if time_limit_ms is not None else depth
+        for current_depth in range(1, final_depth + 1):
+            # Best move of the previous iteration first, the rest by their previous scores
+            moves.sort(key=lambda move: (move == best_move, scores.get(move, 0)), reverse=True)
+            deadline = wall_deadline if current_depth > 1 else None
+            tasks = [(position, player, move, current_depth, deadline, self.generation) for move in moves]
+
+            # The first move is searched alone so the others start with its score as alpha
+            self.alpha.value = NO_ALPHA
+            results = [self.pool.apply(_root_move_task, (tasks[0],))]
+            results += self.pool.map(_root_move_task, tasks[1:], chunksize=1)
+            nodes += sum(result[3] for result in results)
+            if any(result[1] is None for result in results):
+                break  # Out of time, keep the last completed iteration
+
+            move, score, pv, _ = max(results, key=lambda result: result[1])
+            scores = {result[0]: result[1] for result in results}
+            best_move, best_score, best_pv, depth_reached = move, score, pv, current_depth
+            if abs(score) >= brain.WIN_SCORE:
+                break
+            if wall_deadline is not None and (wall_deadline - time.time()) * 2 < time_limit_ms / 1000:
+                break  # Less than half the budget left, the next iteration would not finish
+        return best_move, best_score, best_pv, depth_reached, nodes
+
+
+def get_searcher(workers, strategy=LAZY_SMP):
+    """Returns a ParallelSearcher that is reused across calls and shut down at exit."""
+    searcher = _searchers.get((workers, strategy))
+    if searcher is None:
+        searcher = _searchers[(workers, strategy)] = ParallelSearcher(workers, strategy)
+    return searcher
+
+
+@atexit.register
+def _close_searchers():
+    for searcher in _searchers.values():
+        searcher.close()
+    _searchers.clear()
+
+
+def scaling_report(board, player, depth, worker_counts, strategy=LAZY_SMP):
+    """
+    Times a fixed-depth search with each number of workers.
+    :return: A list of (workers, seconds, nodes, nodes_per_second, speedup) rows
+    """
+    position = from_board(board)
+    rows = []
+    base_time = None
+    for workers in worker_counts:
+        with ParallelSearcher(workers, strategy) as searcher:
+            start = time.perf_counter()
+            nodes = searcher.search(position, player, depth)[4]
+            elapsed = time.perf_counter() - start
+        base_time = base_time or elapsed
+        rows.append((workers, elapsed, nodes, nodes / elapsed, base_time / elapsed))
+    return rows
+
+
+if __name__ == "__main__":
+    from utils import START_POSITION
+
+    parser = argparse.ArgumentParser(description="Measure how the parallel search scales with the number of workers.")
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--strategy", choices=[LAZY_SMP, ROOT_SPLIT], default=LAZY_SMP)
+    args = parser.parse_args()
+
+    print(f"strategy={args.strategy} depth={args.depth}")
+    print(f"{'workers':>7} {'seconds':>8} {'nodes':>10} {'nps':>9} {'speedup':>7}")
+    for workers, elapsed, nodes, nps, speedup in scaling_report(START_POSITION, 2, args.depth, args.workers, args.strategy):
+        print(f"{workers:>7} {elapsed:>8.2f} {nodes:>10} {nps:>9.0f} {speedup:>7.2f}")
@@ -0,0 +1,135 @@
+"""
+Perft: counts the leaf nodes of the legal move tree, to prove move generation
+correct. Runs over both the bitboard generator the search uses and the
+list-of-lists functions in utils.py, and checks both against reference counts.
+
+    python perft.py --check                 # all reference positions, both generators
+    python perft.py --depth 5 --divide      # start position, per root move
+    python perft.py --fen "<fen>" --depth 4
+"""
+import argparse
+import sys
+import time
+
+from bitboard import from_board, from_fen, generate_moves, make_move, move_to_notation, to_board, to_fen, winner
+from utils import START_POSITION, PieceIndex, available_captures, check_winner, get_all_valid_moves
+
+# Leaf counts per depth. Captures are compulsory, and a position where a side has
+# reached the back row is a leaf that isn't expanded further.
+PERFT_REFERENCE = [
+    ("start", "bbbbbbbbb/1b5b1/2b3b2/3b1b3/9/3w1w3/2w3w2/1w5w1/wwwwwwwww w",
+     {1: 25, 2: 623, 3: 14975, 4: 356399, 5: 8419237}),
+    ("captures", "4b4/9/2b1b1b2/3w1w3/9/2b3b2/3w1w3/9/4w4 b",
+     {1: 6, 2: 24, 3: 50, 4: 60, 5: 452, 6: 2972, 7: 28020}),
+    ("race", "bb1b1bbb1/2wb2bbb/3b5/5b1b1/9/5w3/2ww3w1/1w4w2/ww2wwwww w",
+     {1: 25, 2: 24, 3: 564, 4: 13404, 5: 316187}),
+    ("midgame", "bb1b1b1b1/3bb1bbb/1b1b3b1/3b5/3w5/2w1b1w2/7ww/1w3ww2/wwwww3w w",
+     {1: 25, 2: 639, 3: 15118, 4: 377114}),
+    ("breakthrough", "bbbbbb1bb/6b2/1bb5b/9/3w4b/9/4w2b1/ww3w1w1/ww1ww1www w",
+     {1: 22, 2: 419, 3: 7965, 4: 157604}),
+    ("two-a-side", "9/1b5b1/9/9/9/9/9/1w5w1/9 b",
+     {1: 6, 2: 36, 3: 204, 4: 1156, 5: 6392, 6: 35342, 7: 194260}),
+]
+
+
+def perft(position, player, depth):
+    """
+    Counts leaf nodes with the bitboard move generator.
+    :param position: The position as a (black, white) tuple
+    :param player: The player to move (1 for black, 2 for white)
+    :param depth: Plies to look ahead
+    """
+    if winner(position) is not None:
+        return 0
+    moves = generate_moves(position, player)
+    if depth == 1:
+        return len(moves)
+    return sum(perft(make_move(position, move), 3 - player, depth - 1) for move in moves)
+
+
+def perft_lists(board, player, depth, index=None):
+    """
+    Counts leaf nodes with the list-of-lists functions from utils.py. Moves are
+    made in place through a PieceIndex, so the board is unchanged afterwards.
+    """
+    if index is None:
+        index = PieceIndex(board)
+    if check_winner(board) is not None:
+        return 0
+    pieces = index.pieces[player]
+    moves = available_captures(board, player, pieces) or get_all_valid_moves(board, player, pieces)
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for start, end in moves:
+        captured = index.do_move(start, end)
+        total += perft_lists(board, 3 - player, depth - 1, index)
+        index.undo_move(start, end, captured)
+    return total
+
+
+def divide(position, player, depth):
+    """Returns the perft count below every root move, for narrowing down a wrong total."""
+    return {move_to_notation(move): (perft(make_move(position, move), 3 - player, depth - 1) if depth > 1 else 1)
+            for move in generate_moves(position, player)}
+
+
+def check(max_nodes=None, lists=True, out=sys.stdout):
+    """
+    Compares both generators with every reference count.
+    :param max_nodes: Skip reference counts larger than this
+    :param lists: Also check the (much slower) utils.py generator
+    :return: True if every count matched
+    """
+    ok = True
+    for name, fen, counts in PERFT_REFERENCE:
+        position, player = from_fen(fen)
+        board = to_board(position)
+        for depth, expected in sorted(counts.items()):
+            if max_nodes is not None and expected > max_nodes:
+                continue
+            start = time.perf_counter()
+            found = perft(position, player, depth)
+            elapsed = time.perf_counter() - start
+            line = f"{name:<12} depth {depth}: {found:>9} ({found / max(elapsed, 1e-9):>9.0f} nodes/s)"
+            good = found == expected
+            if lists:
+                start = time.perf_counter()
+                found_lists = perft_lists(board, player, depth)
+                elapsed = time.perf_counter() - start
+                line += f", utils {found_lists:>9} ({found_lists / max(elapsed, 1e-9):>8.0f} nodes/s)"
+                good = good and found_lists == expected
+            out.write(f"{line}  {'ok' if good else f'MISMATCH, expected {expected}'}\n")
+            ok = ok and good
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move-tree leaf nodes to check move generation.")
+    parser.add_argument("--check", action="store_true", help="Verify every reference count")
+    parser.add_argument("--max-nodes", type=int, default=None, help="With --check, skip larger reference counts")
+    parser.add_argument("--no-lists", action="store_true", help="With --check, only check the bitboard generator")
+    parser.add_argument("--fen", default=None, help="Position to count, the start position by default")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--divide", action="store_true", help="Print the count below every root move")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.max_nodes, not args.no_lists) else 1)
+
+    position, player = from_fen(args.fen) if args.fen else (from_board(START_POSITION), 2)
+    print(to_fen(position, player))
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(position, player, args.depth)
+        for move, count in counts.items():
+            print(f"{move}: {count}")
+        total = sum(counts.values())
+    else:
+        total = perft(position, player, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"depth {args.depth}: {total} nodes in {elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} nodes/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+from bitboard import PIECE_SQUARE, evaluate, generate_moves
+from transposition import ZOBRIST, ZOBRIST_WHITE_TO_MOVE, hash_position
+
+
+class SearchBoard:
+    """
+    Mutable position for the search tree. do_move/undo_move change the board in
+    place and keep the Zobrist key, the evaluation and the piece counts up to
+    date, so searching a node never copies a board or rescans it.
+    """
+
+    __slots__ = ('black', 'white', 'player', 'key', 'score', 'counts', 'stack', 'piece_square', 'max_value')
+
+    def __init__(self, position, player, piece_square=PIECE_SQUARE):
+        """
+        :param position: The position as a (black, white) tuple of bitboards
+        :param player: The player to move (1 for black, 2 for white)
+        :param piece_square: Piece-square table the evaluation is kept with, see bitboard.EVALUATIONS
+        """
+        self.black, self.white = position
+        self.player = player
+        self.piece_square = piece_square
+        self.max_value = max(abs(value) for values in piece_square[1:] for value in values)  # Largest piece value, bounds what one capture is worth
+        self.key = hash_position(position, player)
+        self.score = evaluate(position, piece_square)  # From White's point of view, like bitboard.evaluate
+        self.counts = [0, self.black.bit_count(), self.white.bit_count()]  # Indexed by player
+        self.stack = []  # (move, captured, key, score) for every move made
+
+    def moves(self):
+        """Returns the legal moves for the player to move."""
+        return generate_moves((self.black, self.white), self.player)
+
+    def score_after(self, move):
+        """Returns the evaluation (White's point of view) after a move, without making it."""
+        player = self.player
+        frm, to = move
+        values = self.piece_square[player]
+        score = self.score + values[to] - values[frm]
+        if not -9 <= to - frm <= 9:
+            score -= self.piece_square[3 - player][(frm + to) >> 1]
+        return score
+
+    def do_move(self, move):
+        """Makes a legal move for the player to move."""
+        player = self.player
+        frm, to = move
+        change = (1 << frm) | (1 << to)
+        values = self.piece_square[player]
+        keys = ZOBRIST[player]
+        captured = not -9 <= to - frm <= 9
+        self.stack.append((move, captured, self.key, self.score))
+        key = self.key ^ keys[frm] ^ keys[to] ^ ZOBRIST_WHITE_TO_MOVE
+        score = self.score + values[to] - values[frm]
+        if player == 1:
+            self.black ^= change
+        else:
+            self.white ^= change
+        if captured:
+            middle = (frm + to) >> 1
+            opponent = 3 - player
+            if player == 1:
+                self.white ^= 1 << middle
+            else:
+                self.black ^= 1 << middle
+            key ^= ZOBRIST[opponent][middle]
+            score -= self.piece_square[opponent][middle]
+            self.counts[opponent] -= 1
+        self.key = key
+        self.score = score
+        self.player = 3 - player
+
+    def do_null_move(self):
+        """Passes the turn to the other player, for null-move pruning."""
+        self.stack.append((None, False, self.key, self.score))
+        self.key ^= ZOBRIST_WHITE_TO_MOVE
+        self.player = 3 - self.player
+
+    def undo_null_move(self):
+        """Takes back do_null_move."""
+        _, _, self.key, self.score = self.stack.pop()
+        self.player = 3 - self.player
+
+    def undo_move(self):
+        """Takes back the last move made with do_move, restoring a captured piece."""
+        (frm, to), captured, self.key, self.score = self.stack.pop()
+        player = self.player = 3 - self.player
+        change = (1 << frm) | (1 << to)
+        if player == 1:
+            self.black ^= change
+            if captured:
+                self.white ^= 1 << ((frm + to) >> 1)
+                self.counts[2] += 1
+        else:
+            self.white ^= change
+            if captured:
+                self.black ^= 1 << ((frm + to) >> 1)
+                self.counts[1] += 1
@@ -0,0 +1,227 @@
+"""
+Headless self-play: plays engine configuration A against configuration B
+over many games in a process pool and reports the match result.
+
+    python selfplay.py --games 200 --workers 8 --a-depth 4 --b-depth 3 --out results.jsonl
+
+Each random opening is played twice with colours swapped, so neither side
+profits from a lucky opening.
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import random
+import time
+
+from bitboard import EVALUATIONS, PIECE_SQUARE, from_board, generate_moves, make_move, move_to_notation, winner
+from brain import SELECTIVE_SEARCH, WIN_SCORE, SearchState, iterative_deepening
+from transposition import TranspositionTable
+from utils import START_POSITION
+
+DEFAULT_MAX_PLIES = 300  # Games that run this long are adjudicated
+TT_MB = 8  # Per engine per game
+RICH_EVALUATION = 'rich'  # evaluation.Evaluator, which needs NumPy
+EVALUATION_CHOICES = sorted(EVALUATIONS) + [RICH_EVALUATION]
+
+
+def engine_config(name, depth=3, time_limit_ms=None, evaluation='default', selective=None):
+    """
+    Describes one side of the match.
+    :param name: Label used in the results
+    :param depth: Search depth, ignored when time_limit_ms is given
+    :param time_limit_ms: Optional time budget per move
+    :param evaluation: Key of bitboard.EVALUATIONS, or 'rich' for evaluation.Evaluator
+    :param selective: The brain.SELECTIVE_SEARCH features to switch on, or None for the SearchState defaults
+    """
+    if evaluation not in EVALUATION_CHOICES:
+        raise ValueError(f"Unknown evaluation {evaluation!r}, expected one of {EVALUATION_CHOICES}")
+    switches = None
+    if selective is not None:
+        unknown = set(selective) - set(SELECTIVE_SEARCH)
+        if unknown:
+            raise ValueError(f"Unknown selective search features {sorted(unknown)}, expected some of {SELECTIVE_SEARCH}")
+        switches = {feature: feature in selective for feature in SELECTIVE_SEARCH}
+    return {'name': name, 'depth': depth, 'time_limit_ms': time_limit_ms, 'evaluation': evaluation,
+            'selective': switches}
+
+
+def random_opening(plies, rng):
+    """
+    Plays random legal moves from the start position.
+    :return: The list of (from_sq, to_sq) moves; shorter than asked if a game would end inside the opening
+    """
+    position, player = from_board(START_POSITION), 2
+    moves = []
+    for _ in range(plies):
+        candidates = [move for move in generate_moves(position, player) if winner(make_move(position, move)) is None]
+        if not candidates:
+            break
+        move = rng.choice(candidates)
+        moves.append(move)
+        position, player = make_move(position, move), 3 - player
+    return moves
+
+
+def adjudicate(position):
+    """Decides a game that hit the move limit: more pieces wins, equal material is a draw."""
+    black, white = position
+    if black.bit_count() == white.bit_count():
+        return None
+    return 1 if black.bit_count() > white.bit_count() else 2
+
+
+def play_game(args):
+    """
+    Plays one game. Runs in a worker process.
+    :param args: (game_index, config_a, config_b, a_player, opening, max_plies)
+    :return: A result record, as written to the JSONL output
+    """
+    game_index, config_a, config_b, a_player, opening, max_plies = args
+    start = time.perf_counter()
+    configs = {a_player: config_a, 3 - a_player: config_b}
+    tables = {1: TranspositionTable(TT_MB), 2: TranspositionTable(TT_MB)}
+    evaluators = {}
+    for side, config in configs.items():
+        if config['evaluation'] == RICH_EVALUATION:
+            from evaluation import Evaluator  # Only imported when asked for, NumPy is optional
+            evaluators[side] = Evaluator()
+    position, player = from_board(START_POSITION), 2
+    moves = []
+    for move in opening:
+        position, player = make_move(position, move), 3 - player
+        moves.append(move)
+
+    won_by, reason = None, None
+    while won_by is None:
+        if len(moves) >= max_plies:
+            won_by, reason = adjudicate(position), 'move-limit'
+            break
+        config = configs[player]
+        state = SearchState(tables[player], evaluator=evaluators.get(player), **(config.get('selective') or {}))
+        move, score, _, _, _ = iterative_deepening(position, player, config['depth'], config['time_limit_ms'],
+                                                   state=state,
+                                                   piece_square=EVALUATIONS.get(config['evaluation'], PIECE_SQUARE))
+        if move is None:
+            won_by, reason = 3 - player, 'no-moves'  # A player who cannot move loses
+            break
+        if score is not None and score >= WIN_SCORE:
+            # The mover has seen a forced win, playing it out only costs time
+            won_by, reason = player, 'adjudicated'
+        position, player = make_move(position, move), 3 - player
+        moves.append(move)
+        if winner(position) is not None:
+            won_by, reason = winner(position), 'back-row'
+
+    if won_by is None:
+        result = 'draw'
+    else:
+        result = 'a' if won_by == a_player else 'b'
+    return {
+        'game': game_index,
+        'a': config_a['name'],
+        'b': config_b['name'],
+        'a_color': 'white' if a_player == 2 else 'black',
+        'result': result,
+        'reason': reason,
+        'plies': len(moves),
+        'opening_plies': len(opening),
+        'moves': [move_to_notation(move) for move in moves],
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def elo_with_error(wins, draws, losses):
+    """
+    Elo difference of A over B and the half-width of its 95% confidence interval.
+    :return: (elo, error); either can be infinite when a side scored every point
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance:
+        margin = 1.96 * math.sqrt(variance / games)
+        low, high = max(score - margin, 0), min(score + margin, 1)
+    else:
+        # Every game had the same result, so the sample variance claims a certainty
+        # a few games can't give: use the Wilson interval of the score instead
+        z2 = 1.96 ** 2
+        centre = (score + z2 / (2 * games)) / (1 + z2 / games)
+        spread = 1.96 * math.sqrt(score * (1 - score) / games + z2 / (4 * games ** 2)) / (1 + z2 / games)
+        low, high = max(centre - spread, 0), min(centre + spread, 1)
+
+    def to_elo(fraction):
+        if fraction <= 0:
+            return -math.inf
+        if fraction >= 1:
+            return math.inf
+        return 400 * math.log10(fraction / (1 - fraction))
+
+    low, high = to_elo(low), to_elo(high)
+    error = math.inf if math.isinf(low) or math.isinf(high) else (high - low) / 2
+    return to_elo(score), error
+
+
+def run_match(config_a, config_b, games, workers=None, opening_plies=4, max_plies=DEFAULT_MAX_PLIES, out=None, seed=None):
+    """
+    Plays a match and streams each finished game to out as a JSON line.
+    :return: (wins, draws, losses) from A's point of view, and the elapsed seconds
+    """
+    rng = random.Random(seed)
+    tasks = []
+    for game_index in range(games):
+        if game_index % 2 == 0:
+            opening = random_opening(opening_plies, rng)
+        tasks.append((game_index, config_a, config_b, 2 if game_index % 2 == 0 else 1, opening, max_plies))
+
+    wins = draws = losses = 0
+    start = time.perf_counter()
+    with mp.Pool(workers) as pool:
+        for record in pool.imap_unordered(play_game, tasks):
+            if out is not None:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            wins += record['result'] == 'a'
+            draws += record['result'] == 'draw'
+            losses += record['result'] == 'b'
+    return (wins, draws, losses), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, one per core by default")
+    parser.add_argument("--opening-plies", type=int, default=4, help="Random moves played before the engines take over")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="Games are adjudicated on material after this")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default=None, help="JSONL file that receives one record per game")
+    for side in ("a", "b"):
+        parser.add_argument(f"--{side}-depth", type=int, default=3)
+        parser.add_argument(f"--{side}-time", type=int, default=None, help="Milliseconds per move, overrides the depth")
+        parser.add_argument(f"--{side}-eval", choices=EVALUATION_CHOICES, default='default')
+        parser.add_argument(f"--{side}-selective", nargs="*", choices=SELECTIVE_SEARCH, default=None,
+                            help="Selective search features to switch on, none for a plain search")
+    args = parser.parse_args()
+
+    config_a = engine_config("A", args.a_depth, args.a_time, args.a_eval, args.a_selective)
+    config_b = engine_config("B", args.b_depth, args.b_time, args.b_eval, args.b_selective)
+    out = open(args.out, "w") if args.out else None
+    try:
+        (wins, draws, losses), elapsed = run_match(config_a, config_b, args.games, args.workers, args.opening_plies,
+                                                   args.max_plies, out, args.seed)
+    finally:
+        if out is not None:
+            out.close()
+
+    elo, error = elo_with_error(wins, draws, losses)
+    print(f"A: {config_a}")
+    print(f"B: {config_b}")
+    print(f"A wins {wins}, draws {draws}, losses {losses}")
+    print(f"Elo difference A - B: {elo:+.1f} +/- {error:.1f} (95%)")
+    print(f"{args.games} games in {elapsed:.1f}s, {args.games / elapsed * 60:.1f} games/min")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Endgame tablebases: every position with up to a few pieces per side, solved
+by retrograde analysis and stored as one file per material signature.
+
+    python tablebase.py --pieces 2 --out tablebases    # all signatures up to 2 against 2
+
+Index: a piece never stands on its own winning row in a position that is
+still being played, so Black's pieces are on squares 0-71 and White's on
+9-80, 72 squares each. The sorted squares of each side are ranked in the
+combinatorial number system (colex order), and
+
+    index = (black_rank * C(72, whites) + white_rank) * 2 + (player - 1)
+
+One byte per position: 0 is a draw (or a square clash that never occurs),
+1-127 a win for the player to move in that many plies, 128 + n a loss in n plies.
+Tables are read through mmap, so probing doesn't load them into memory.
+"""
+import argparse
+import mmap
+import os
+import time
+from itertools import combinations
+from math import comb
+
+from bitboard import (BLACK_GOAL, COLS, WHITE_GOAL, generate_captures, generate_quiet_moves, has_winning_step,
+                      iter_squares, make_move)
+
+MAGIC = b"FNTB"
+VERSION = 1
+HEADER_BYTES = 8  # MAGIC, VERSION, black pieces, white pieces, padding
+SIDE_SQUARES = 72  # Squares a piece can stand on without having won
+WHITE_OFFSET = COLS  # White's squares start on row 1
+LOSS = 128  # Byte values from here on are losses
+MAX_DISTANCE = 127
+DEFAULT_PIECES = 2
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+WIN, DRAW, LOSS_RESULT = 1, 0, -1  # Results returned by probe, for the player to move
+
+
+def table_name(black_count, white_count):
+    return f"b{black_count}w{white_count}.tb"
+
+
+def table_size(black_count, white_count):
+    """Number of entries (and bytes) in a table."""
+    return comb(SIDE_SQUARES, black_count) * comb(SIDE_SQUARES, white_count) * 2
+
+
+def rank(squares):
+    """Colex rank of a sorted tuple of side squares (0-71)."""
+    return sum(comb(sq, i + 1) for i, sq in enumerate(squares))
+
+
+def position_index(position, player):
+    """
+    Index of a position in its table.
+    :return: ((black_count, white_count), index), or None if a piece stands on its winning row
+    """
+    black, white = position
+    if black & BLACK_GOAL or white & WHITE_GOAL:
+        return None
+    black_squares = tuple(iter_squares(black))
+    white_squares = tuple(sq - WHITE_OFFSET for sq in iter_squares(white))
+    index = (rank(black_squares) * comb(SIDE_SQUARES, len(white_squares)) + rank(white_squares)) * 2 + player - 1
+    return (len(black_squares), len(white_squares)), index
+
+
+def decode(value):
+    """Turns a table byte into (result, distance) for the player to move."""
+    if value == 0:
+        return DRAW, 0
+    if value < LOSS:
+        return WIN, value
+    return LOSS_RESULT, value - LOSS
+
+
+def _encode(result, distance):
+    if distance > MAX_DISTANCE:
+        raise OverflowError(f"Distance {distance} doesn't fit a table byte")
+    return distance if result == WIN else LOSS + distance
+
+
+class Tablebase:
+    """Probes the table files in a directory, opening each through mmap on first use."""
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.files = {}
+        self.maps = {}
+        self.signatures = set()
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith("b") and name.endswith(".tb"):
+                    black_count, white_count = name[1:-3].split("w")
+                    self.signatures.add((int(black_count), int(white_count)))
+        # Probing is skipped outright for positions with more pieces than this
+        self.max_pieces = max((black + white for black, white in self.signatures), default=-1)
+
+    def __bool__(self):
+        return bool(self.signatures)
+
+    def _table(self, signature):
+        table = self.maps.get(signature)
+        if table is None:
+            handle = open(os.path.join(self.directory, table_name(*signature)), "rb")
+            table = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            if table[:4] != MAGIC or table[4] != VERSION or tuple(table[5:7]) != signature:
+                raise ValueError(f"{table_name(*signature)} is not a version {VERSION} table for {signature}")
+            self.files[signature] = handle
+            self.maps[signature] = table
+        return table
+
+    def probe(self, position, player):
+        """
+        Looks up a position.
+        :param position: The position as a (black, white) tuple
+        :param player: The player to move (1 for black, 2 for white)
+        :return: (result, distance) for the player to move, with result WIN, DRAW or LOSS_RESULT and
+                 the distance in plies; None when there is no table for the material
+        """
+        found = position_index(position, player)
+        if found is None or found[0] not in self.signatures:
+            return None
+        signature, index = found
+        return decode(self._table(signature)[HEADER_BYTES + index])
+
+    def best_move(self, position, player):
+        """
+        Picks the move that wins fastest, draws, or loses slowest.
+        :return: (move, (result, distance)) or None when the position isn't in the tables
+        """
+        entry = self.probe(position, player)
+        if entry is None:
+            return None
+        best_move, best_key = None, None
+        for move in generate_captures(position, player) or generate_quiet_moves(position, player):
+            child = make_move(position, move)
+            if child[0] & BLACK_GOAL or child[1] & WHITE_GOAL:
+                return move, (WIN, 1)
+            result, distance = self.probe(child, 3 - player)
+            # The child is from the opponent's side: their loss is our win
+            key = (-result, -distance if result == LOSS_RESULT else distance)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move, entry
+
+    def close(self):
+        for table in self.maps.values():
+            table.close()
+        for handle in self.files.values():
+            handle.close()
+        self.maps.clear()
+        self.files.clear()
+
+
+def _colex_combinations(count):
+    """All sorted tuples of count side squares, in rank order."""
+    return sorted(combinations(range(SIDE_SQUARES), count), key=lambda squares: squares[::-1])
+
+
+def _capture_result(position, player, captures, child_value):
+    """
+    Result of a position where the player to move has to capture.
+    :param child_value: Function returning the table byte of a position after a capture
+    :return: (result, distance) for the player to move
+    """
+    goal = BLACK_GOAL if player == 1 else WHITE_GOAL
+    children = []
+    for move in captures:
+        if (1 << move[1]) & goal:
+            return WIN, 1
+        children.append(decode(child_value(make_move(position, move), 3 - player)))
+    losses = [distance for result, distance in children if result == LOSS_RESULT]
+    if losses:
+        return WIN, min(losses) + 1  # The opponent loses after the capture
+    if any(result == DRAW for result, _ in children):
+        return DRAW, 0
+    return LOSS_RESULT, max(distance for _, distance in children) + 1
+
+
+def generate_table(black_count, white_count, smaller):
+    """
+    Solves one material signature.
+    :param smaller: Dict from signature to the solved bytearray of every table a capture can lead to
+    :return: bytearray with one byte per index
+    """
+    black_sets = _colex_combinations(black_count)
+    white_sets = _colex_combinations(white_count)
+    black_ranks = {squares: i for i, squares in enumerate(black_sets)}
+    white_ranks = {squares: i for i, squares in enumerate(white_sets)}
+    black_boards = [sum(1 << sq for sq in squares) for squares in black_sets]
+    white_boards = [sum(1 << (sq + WHITE_OFFSET) for sq in squares) for squares in white_sets]
+    white_total = len(white_sets)
+    size = len(black_sets) * white_total * 2
+    values = bytearray(size)
+    pending = bytearray(size)  # Unresolved moves left for positions that are still open
+    buckets = [[] for _ in range(MAX_DISTANCE + 2)]  # Resolved positions by distance
+
+    def child_value(child, player):
+        # Value of the position after a capture, from the table with one piece less
+        signature, index = position_index(child, player)
+        return smaller[signature][index]
+
+    # Resolve what is decided without looking at positions of this table:
+    # captures (forced, and always into a smaller table), winning steps and having no move
+    for black_rank, black in enumerate(black_boards):
+        for white_rank, white in enumerate(white_boards):
+            if black & white:
+                continue
+            position = black, white
+            base = (black_rank * white_total + white_rank) * 2
+            for player in (1, 2):
+                index = base + player - 1
+                captures = generate_captures(position, player)
+                if captures:
+                    result, distance = _capture_result(position, player, captures, child_value)
+                    if result != DRAW:
+                        values[index] = _encode(result, distance)
+                        buckets[distance].append(index)
+                elif has_winning_step(position, player):
+                    values[index] = _encode(WIN, 1)
+                    buckets[1].append(index)
+                else:
+                    moves = len(generate_quiet_moves(position, player))
+                    if moves:
+                        pending[index] = moves
+                    else:
+                        values[index] = _encode(LOSS_RESULT, 0)  # A player who cannot move loses
+                        buckets[0].append(index)
+
+    # Retrograde propagation in order of distance: a parent of a lost position is won
+    # one ply later, and a parent whose moves all lead to won positions is lost once the
+    # last of them is reached. Parents only ever made quiet moves into this table.
+    for distance, bucket in enumerate(buckets):
+        for index in bucket:
+            lost = values[index] >= LOSS
+            rest, child_player = divmod(index, 2)
+            black_rank, white_rank = divmod(rest, white_total)
+            # The parent had the other player to move, who moved one of their pieces here
+            mover = 2 - child_player  # child_player is 0 for Black, 1 for White
+            if mover == 1:
+                pieces, own_ranks, forward = black_sets[black_rank], black_ranks, COLS
+                occupied = set(pieces) | {sq + WHITE_OFFSET for sq in white_sets[white_rank]}
+            else:
+                pieces, own_ranks, forward = white_sets[white_rank], white_ranks, COLS
+                occupied = {sq + WHITE_OFFSET for sq in pieces} | set(black_sets[black_rank])
+            offset = 0 if mover == 1 else WHITE_OFFSET
+            for piece in pieces:
+                to = piece + offset
+                col = to % COLS
+                sources = [to - forward if mover == 1 else to + forward]
+                if col > 0:
+                    sources.append(to - 1)
+                if col < COLS - 1:
+                    sources.append(to + 1)
+                for frm in sources:
+                    side_square = frm - offset
+                    if frm in occupied or not 0 <= side_square < SIDE_SQUARES:
+                        continue
+                    squares = tuple(sorted(side_square if sq == piece else sq for sq in pieces))
+                    if mover == 1:
+                        parent = (own_ranks[squares] * white_total + white_rank) * 2
+                    else:
+                        parent = (black_rank * white_total + own_ranks[squares]) * 2 + 1
+                    if not pending[parent]:
+                        continue  # Already decided
+                    if lost:
+                        values[parent] = _encode(WIN, distance + 1)
+                        pending[parent] = 0
+                        buckets[distance + 1].append(parent)
+                    else:
+                        pending[parent] -= 1
+                        if not pending[parent]:
+                            values[parent] = _encode(LOSS_RESULT, distance + 1)
+                            buckets[distance + 1].append(parent)
+        bucket.clear()
+    return values
+
+
+def generate(max_pieces=DEFAULT_PIECES, directory=TABLEBASE_DIR, verbose=True):
+    """
+    Builds every table with up to max_pieces pieces per side, smallest first.
+    :return: The list of signatures written
+    """
+    os.makedirs(directory, exist_ok=True)
+    signatures = sorted(((black, white) for black in range(max_pieces + 1) for white in range(max_pieces + 1)),
+                        key=lambda signature: (sum(signature), signature))
+    solved = {}
+    for signature in signatures:
+        start = time.perf_counter()
+        values = generate_table(*signature, solved)
+        solved[signature] = values
+        with open(os.path.join(directory, table_name(*signature)), "wb") as handle:
+            handle.write(MAGIC + bytes([VERSION, signature[0], signature[1], 0]))
+            handle.write(values)
+        if verbose:
+            wins = sum(1 for value in values if 0 < value < LOSS)
+            losses = sum(1 for value in values if value >= LOSS)
+            print(f"{table_name(*signature)}: {len(values)} positions, {wins} wins, {losses} losses, "
+                  f"{time.perf_counter() - start:.1f}s")
+    return signatures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis.")
+    parser.add_argument("--pieces", type=int, default=DEFAULT_PIECES, help="Most pieces per side")
+    parser.add_argument("--out", default=TABLEBASE_DIR, help="Directory that receives the table files")
+    args = parser.parse_args()
+    generate(args.pieces, args.out)
+
+
+if __name__ == "__main__":
+    main()
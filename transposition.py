@@ -0,0 +1,117 @@
+import random
+from array import array
+
+from bitboard import SQUARES, iter_squares
+
+# Zobrist keys: one random 64-bit number per (player, square), plus one that is
+# mixed in when White is to move. A fixed seed keeps keys stable between runs.
+_rng = random.Random(0xF1A9C0)
+ZOBRIST = [None, [_rng.getrandbits(64) for _ in range(SQUARES)], [_rng.getrandbits(64) for _ in range(SQUARES)]]
+ZOBRIST_WHITE_TO_MOVE = _rng.getrandbits(64)
+del _rng
+
+# Bound types
+EXACT, LOWER, UPPER = 1, 2, 3
+
+NO_SQUARE = 127  # Stored in place of a square when an entry has no best move
+BUCKET_WORDS = 4  # Two slots per bucket, each a (key ^ data, data) pair of 64-bit words
+BUCKET_BYTES = BUCKET_WORDS * 8
+MASK_64 = (1 << 64) - 1
+
+
+def hash_position(position, player):
+    """
+    Computes the Zobrist key of a position from scratch.
+    :param position: The position as a (black, white) tuple
+    :param player: The player to move (1 for black, 2 for white)
+    :return: The 64-bit key
+    """
+    black, white = position
+    key = ZOBRIST_WHITE_TO_MOVE if player == 2 else 0
+    for sq in iter_squares(black):
+        key ^= ZOBRIST[1][sq]
+    for sq in iter_squares(white):
+        key ^= ZOBRIST[2][sq]
+    return key
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table. Each bucket has a depth-preferred slot and
+    an always-replace slot, so deep results survive while fresh shallow results
+    still get cached. Entries are packed into 64-bit words and stored next to
+    key ^ data, which lets a reader detect entries torn by a concurrent writer.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        """
+        :param size_mb: Memory budget in megabytes, rounded down to a power-of-two number of buckets
+        :param buffer: Optional writable buffer (e.g. shared memory) to hold the table instead of a private array
+        """
+        buckets = self.size_bytes(size_mb) // BUCKET_BYTES
+        self.mask = buckets - 1
+        if buffer is None:
+            self.table = array('Q', bytes(buckets * BUCKET_BYTES))
+        else:
+            self.table = memoryview(buffer).cast('B')[:buckets * BUCKET_BYTES].cast('Q')
+        self.generation = 0
+
+    @staticmethod
+    def size_bytes(size_mb):
+        """Returns the number of bytes a table built with this budget occupies."""
+        buckets = 1
+        while buckets * 2 * BUCKET_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        return buckets * BUCKET_BYTES
+
+    def clear(self):
+        memoryview(self.table).cast('B')[:] = bytes(len(self.table) * 8)
+        self.generation = 0
+
+    def new_search(self):
+        """Marks the entries of earlier searches as stale so they can be replaced."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        :param key: The Zobrist key of the position
+        :return: (depth, score, bound, move) or None if the position is not stored
+        """
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        for slot in (index, index + 2):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                frm = (data >> 22) & 0x7F
+                move = None if frm == NO_SQUARE else (frm, (data >> 15) & 0x7F)
+                return (data >> 8) & 0x7F, (data >> 32) - 0x80000000, (data >> 29) & 0x3, move
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores a search result.
+        :param key: The Zobrist key of the position
+        :param depth: The depth the position was searched to
+        :param score: The score found, from the point of view of the side to move
+        :param bound: EXACT, LOWER when the search failed high or UPPER when it failed low
+        :param move: The best (from_sq, to_sq) move, or None
+        """
+        frm, to = move if move else (NO_SQUARE, NO_SQUARE)
+        generation = self.generation
+        data = ((score + 0x80000000) << 32 | bound << 29 | frm << 22 | to << 15
+                | min(depth, 0x7F) << 8 | generation) & MASK_64
+        table = self.table
+        index = (key & self.mask) * BUCKET_WORDS
+        old = table[index + 1]
+        if (not old or table[index] ^ old == key or (old & 0xFF) != generation
+                or depth >= (old >> 8) & 0x7F):
+            if old and table[index] ^ old != key:
+                # Demote the previous deep entry to the always-replace slot
+                table[index + 2] = table[index]
+                table[index + 3] = old
+            table[index] = key ^ data
+            table[index + 1] = data
+        else:
+            table[index + 2] = key ^ data
+            table[index + 3] = data
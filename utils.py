@@ -2,6 +2,19 @@
 
 ROWS, COLS = 9, 9  # Define board dimensions
 
+# Board setup from the given image
+START_POSITION = [
+    [1, 1, 1, 1, 1, 1, 1, 1, 1],
+    [0, 1, 0, 0, 0, 0, 0, 1, 0],
+    [0, 0, 1, 0, 0, 0, 1, 0, 0],
+    [0, 0, 0, 1, 0, 1, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 2, 0, 2, 0, 0, 0],
+    [0, 0, 2, 0, 0, 0, 2, 0, 0],
+    [0, 2, 0, 0, 0, 0, 0, 2, 0],
+    [2, 2, 2, 2, 2, 2, 2, 2, 2]
+]
+
 
 def make_move_for_ai(board, start, end):
     """
@@ -31,21 +44,112 @@ def make_move_for_ai(board, start, end):
 
     return new_board
 
-def get_all_valid_moves(board, current_player):
+def _build_move_tables():
+    """
+    Builds, for every player and square, the squares a piece there can step to
+    and the (landing, jumped) square pairs of its captures. Only offsets that
+    stay on the board and go in the player's direction are listed, so move
+    generation needs no bounds checks or player branches.
+    """
+    steps = [None, [], []]
+    jumps = [None, [], []]
+    for player, forward in ((1, 1), (2, -1)):  # Black moves down, White moves up
+        for row in range(ROWS):
+            step_row, jump_row = [], []
+            for col in range(COLS):
+                targets = [(row, col + d_col) for d_col in (-1, 1) if 0 <= col + d_col < COLS]
+                if 0 <= row + forward < ROWS:
+                    targets.append((row + forward, col))
+                step_row.append(tuple(targets))
+                captures = []
+                if 0 <= row + 2 * forward < ROWS:
+                    for d_col in (-2, 2):
+                        if 0 <= col + d_col < COLS:
+                            captures.append(((row + 2 * forward, col + d_col), (row + forward, col + d_col // 2)))
+                jump_row.append(tuple(captures))
+            steps[player].append(step_row)
+            jumps[player].append(jump_row)
+    return steps, jumps
+
+
+# STEPS[player][row][col] is a tuple of (end_row, end_col) squares, and
+# JUMPS[player][row][col] a tuple of ((end_row, end_col), (middle_row, middle_col)) captures
+STEPS, JUMPS = _build_move_tables()
+
+
+def piece_squares(board, player):
+    """Returns the (row, col) squares of the given player's pieces."""
+    return [(row, col) for row in range(ROWS) for col in range(COLS) if board[row][col] == player]
+
+
+class PieceIndex:
+    """
+    The squares of both players' pieces, kept next to a board so move
+    generation only visits occupied squares. do_move/undo_move change the
+    board in place and keep the index in step with it.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.pieces = [None, set(piece_squares(board, 1)), set(piece_squares(board, 2))]  # Indexed by player
+
+    def do_move(self, start, end):
+        """
+        Makes a move on the board, removing a jumped piece.
+        :return: The square of the captured piece, or None, to pass to undo_move
+        """
+        board = self.board
+        start_row, start_col = start
+        end_row, end_col = end
+        player = board[start_row][start_col]
+        board[end_row][end_col] = player
+        board[start_row][start_col] = 0
+        pieces = self.pieces[player]
+        pieces.remove(start)
+        pieces.add(end)
+        if abs(start_row - end_row) != 2:
+            return None
+        middle = ((start_row + end_row) // 2, (start_col + end_col) // 2)
+        board[middle[0]][middle[1]] = 0
+        self.pieces[3 - player].remove(middle)
+        return middle
+
+    def undo_move(self, start, end, captured):
+        """Takes back a move made with do_move."""
+        board = self.board
+        player = board[end[0]][end[1]]
+        board[start[0]][start[1]] = player
+        board[end[0]][end[1]] = 0
+        pieces = self.pieces[player]
+        pieces.remove(end)
+        pieces.add(start)
+        if captured is not None:
+            board[captured[0]][captured[1]] = 3 - player
+            self.pieces[3 - player].add(captured)
+
+
+def get_all_valid_moves(board, current_player, pieces=None):
     """
     Generates all valid moves for the current player.
     :param board: The current game board
     :param current_player: The current player (1 for black, 2 for white)
+    :param pieces: Optional squares of the player's pieces (e.g. from a PieceIndex); the board is scanned otherwise
     :return: A list of all valid moves
     """
+    if pieces is None:
+        pieces = piece_squares(board, current_player)
+    opponent = 3 - current_player
+    steps = STEPS[current_player]
+    jumps = JUMPS[current_player]
     moves = []
-    for row in range(ROWS):
-        for col in range(COLS):
-            if board[row][col] == current_player:
-                # Check all possible moves (you may already have movement logic, so reuse it here)
-                possible_moves = get_piece_valid_moves(board, (row, col), current_player)  # Implement this to get valid moves for a piece
-                for move in possible_moves:
-                    moves.append(((row, col), move))  # Store moves as ((start_row, start_col), (end_row, end_col))
+    for start in pieces:
+        row, col = start
+        for end in steps[row][col]:
+            if board[end[0]][end[1]] == 0:
+                moves.append((start, end))  # Store moves as ((start_row, start_col), (end_row, end_col))
+        for end, middle in jumps[row][col]:
+            if board[end[0]][end[1]] == 0 and board[middle[0]][middle[1]] == opponent:
+                moves.append((start, end))
     return moves
 
 
@@ -59,33 +163,17 @@ def is_valid_move(board, start, end, player):
         return False
     if board[end_row][end_col] != 0:
         return False
-    
+    if player not in (1, 2):
+        return False
+
     # Simple forward or sideways move (non-capture)
-    if player == 1:  # Black moves (downwards)
-        if start_row == end_row and abs(start_col - end_col) == 1:  # Sideways
-            return True
-        if start_col == end_col and end_row - start_row == 1:  # Forward (downwards)
-            return True
-    elif player == 2:  # White moves (upwards)
-        if start_row == end_row and abs(start_col - end_col) == 1:  # Sideways
-            return True
-        if start_col == end_col and start_row - end_row == 1:  # Forward (upwards)
-            return True
+    if end in STEPS[player][start_row][start_col]:
+        return True
 
     # Check if a capture is possible (forward diagonal only)
-    if player == 1:  # Black can capture diagonally downwards
-        if end_row - start_row == 2 and abs(start_col - end_col) == 2:  # Jump two rows down
-            middle_row = (start_row + end_row) // 2
-            middle_col = (start_col + end_col) // 2
-            if board[middle_row][middle_col] == 2:  # Check if White piece is being captured
-                return True
-    elif player == 2:  # White can capture diagonally upwards
-        if start_row - end_row == 2 and abs(start_col - end_col) == 2:  # Jump two rows up
-            middle_row = (start_row + end_row) // 2
-            middle_col = (start_col + end_col) // 2
-            if board[middle_row][middle_col] == 1:  # Check if Black piece is being captured
-                return True
-
+    for target, (middle_row, middle_col) in JUMPS[player][start_row][start_col]:
+        if target == end:
+            return board[middle_row][middle_col] == 3 - player  # Check the jumped piece is the opponent's
     return False
 
 def get_piece_valid_moves(board, position, player):
@@ -96,17 +184,7 @@ def get_piece_valid_moves(board, position, player):
     :param player: The current player (1 for black, 2 for white)
     :return: A list of valid end positions for the piece
     """
-    row, col = position
-    moves = []
-    
-    # Check all directions (for example, forward, sideways, and capture diagonally)
-    # You may reuse your existing is_valid_move() function
-    for d_row, d_col in [(-1, 0), (1, 0), (0, -1), (0, 1), (-2, -2), (-2, 2), (2, -2), (2, 2)]:  # Adjust based on your movement rules
-        new_row, new_col = row + d_row, col + d_col
-        if is_valid_move(board, position, (new_row, new_col), player):  # You likely have this function
-            moves.append((new_row, new_col))
-    
-    return moves
+    return [end for start, end in get_all_valid_moves(board, player, [position])]
 
 def is_terminal(board):
     """
@@ -128,22 +206,18 @@ def check_winner(board):
     return None
 
 #  for any available captures for the current player
-def available_captures(board, player):
+def available_captures(board, player, pieces=None):
+    """
+    Lists the capturing jumps the player can make.
+    :param pieces: Optional squares of the player's pieces (e.g. from a PieceIndex); the board is scanned otherwise
+    """
+    if pieces is None:
+        pieces = piece_squares(board, player)
+    opponent = 3 - player
+    jumps = JUMPS[player]
     captures = []
-    for row in range(ROWS):
-        for col in range(COLS):
-            if board[row][col] == player:
-                # Check forward diagonal directions for a capture
-                if player == 1:  # Black (moving downwards)
-                    for d_row, d_col in [(2, 2), (2, -2)]:  # Check forward-down diagonals
-                        new_row, new_col = row + d_row, col + d_col
-                        if is_valid_move(board, (row, col), (new_row, new_col), player):
-                            captures.append(((row, col), (new_row, new_col)))
-                elif player == 2:  # White (moving upwards)
-                    for d_row, d_col in [(-2, 2), (-2, -2)]:  # Check forward-up diagonals
-                        new_row, new_col = row + d_row, col + d_col
-                        if is_valid_move(board, (row, col), (new_row, new_col), player):
-                            captures.append(((row, col), (new_row, new_col)))
+    for start in pieces:
+        for end, middle in jumps[start[0]][start[1]]:
+            if board[end[0]][end[1]] == 0 and board[middle[0]][middle[1]] == opponent:
+                captures.append((start, end))
     return captures
-
-